@@ -1,21 +1,34 @@
  # Importing Libraries
-import streamlit as st
+import io
+import logging
+import sqlite3
 import numpy as np
 import pandas as pd
-from scipy.optimize import curve_fit
-from scipy.interpolate import interp1d
-from matplotlib import cm
-import matplotlib as mpl
-import matplotlib.pylab as plt
-from mpl_toolkits.axes_grid1.inset_locator import inset_axes
-from IPython.display import set_matplotlib_formats
-from decimal import Decimal
-import subprocess
-import re
-import os
-from lib.display import *
-from lib.extract import *
-from lib.tools import *
+import streamlit as st
+from lib.display import (display_head_data, display_compounds, display_concentrations, display_experiments,
+                         display_heatmap, display_performance, display_job, display_qc)
+from lib.plate import MOCK
+from lib.plot import mock_curves, render_compounds, PREVIEW_DPI, EXPORT_DPI
+from lib.sidecar import cached_plate, cached_sheet_names
+from lib.pipeline import fit_extracted_plate, iter_workbook_results, plate_records
+from lib.bootstrap import bootstrap_plate
+from lib.store import store_fits, fit_settings, query_compound
+from lib.layout import load_layout, list_layouts, DEFAULT_LAYOUT
+from lib.qc import plate_qc, MIN_Z_PRIME
+from lib.models import MODELS, DEFAULT_MODEL, AUTO_MODEL, log_half_max
+from lib.export import safe_name, compound_jobs, write_report_pdf, write_figures_zip
+from lib.jobs import submit_job, resume_jobs, get_job, job_sheets, ACTIVE
+from lib.cache import file_hash, SHEET_CACHE, PLATE_CACHE, FIT_CACHE, FIGURE_CACHE
+from lib.instrument import configure_logging, log_event, collect, profiled, timer, count
+
+
+# Compound plots shown per page; 384- and 1536-well plates would otherwise render hundreds at once
+PLOTS_PER_PAGE = 24
+
+
+def remember_exclusions(store, key, i):
+    """Keep a well's excluded points after its selector leaves the page."""
+    store[i] = st.session_state[key]
 
 
 # Set the page configuration
@@ -26,80 +39,218 @@ st.set_page_config(
     page_icon="🧪"
 )
 
-plt.rcParams['savefig.dpi'] = 600
-plt.rcParams['figure.autolayout'] = False
-plt.rcParams['figure.figsize'] = 12, 8
-plt.rcParams['axes.labelsize'] = 50
-plt.rcParams['axes.titlesize'] = 20
-plt.rcParams['axes.linewidth'] = 2.0
-plt.rcParams['font.size'] = 30
-plt.rcParams['lines.linewidth'] = 2.0
-plt.rcParams['lines.markersize'] = 8
-plt.rcParams['legend.fontsize'] = 18
-plt.rcParams['xtick.major.size'] = 15 # Set the length of x-axis ticks to 5
-plt.rcParams['ytick.major.size'] = 15 # Set the length of y-axis ticks to 5
-plt.rcParams["xtick.major.width"] = 2 # Set the length of x-axis ticks to 5
-plt.rcParams["ytick.major.width"] = 2 # Set the length of y-axis ticks to 5
+def process_all_sheets(uploaded_file, sheet_names, n_experiments, layout, content_hash, model, criterion, qc_limits,
+                       n_boot=0):
+    """
+    Fit every sheet of the workbook in turn and grow a summary table as each one finishes.
+
+    Plates are not cached here so memory stays at about one plate; plates failing QC are not fitted.
+    Bootstrap intervals (n_boot resamples, 0 to skip) are added sheet by sheet.
+    """
+    st.markdown("## All sheets")
+    progress = st.progress(0.0)
+    summary  = st.empty()
+
+    records = []
+    results = iter_workbook_results(uploaded_file, n_experiments, layout, model, criterion, qc_limits, n_boot,
+                                    file=uploaded_file.name)
+    for idx, (sheet, sheet_records, fits, error, n_replicates) in enumerate(results, 1):
+        progress.progress(idx / len(sheet_names), text=f"{sheet} ({idx}/{len(sheet_names)})")
+
+        with st.expander(sheet, expanded=False):
+            if error is not None:
+                st.error(f"Could not process sheet {sheet}: {error}")
+            elif not sheet_records:
+                st.info("No compounds to fit on this sheet.")
+            else:
+                st.dataframe(pd.DataFrame(sheet_records).drop(columns=["file", "sheet"]), hide_index=True)
+                try:
+                    store_fits(sheet_records, fits, content_hash,
+                               fit_settings(layout["name"], n_replicates, n_boot, model, criterion))
+                except sqlite3.Error as err:
+                    st.warning(f"Could not save the results: {err}")
+
+        records.extend(sheet_records)
+        if records:
+            summary.dataframe(pd.DataFrame(records), hide_index=True)
+
+    if records:
+        st.download_button("Download summary CSV", pd.DataFrame(records).to_csv(index=False),
+                           file_name="ic50_summary.csv", mime="text/csv")
+
+
+def deferred_report(write, jobs, *args):
+    """
+    One report file of a plate, written only when its download button is clicked.
+
+    Reports are neither built on every rerun nor kept in the figure cache.
+    """
+    def build():
+        output = io.BytesIO()
+        write(jobs, output, *args)
+        return output.getvalue()
+    return build
+
+
+def close_job():
+    st.session_state["open_job"] = ""
+    st.query_params.clear()
+
+
+def show_job(job_id):
+    """Show a background job, polling its progress every two seconds until it finishes."""
+    job = get_job(job_id)
+    if job is None:
+        st.error(f"Unknown job {job_id}")
+        st.button("New analysis", on_click=close_job)
+        return
+
+    @st.fragment(run_every=2 if job["status"] in ACTIVE else None)
+    def job_progress():
+        current = get_job(job_id)
+        display_job(current, job_sheets(job_id))
+        # One full rerun once the job ends, which also stops the polling
+        if current["status"] not in ACTIVE and job["status"] in ACTIVE:
+            st.rerun()
+
+    job_progress()
+    st.button("New analysis", on_click=close_job)
 
 
 def main():
+    configure_logging()
+
+    # ?profile=1 profiles the whole run and shows the report in the Performance panel
+    profile = st.query_params.get("profile") == "1"
+    with collect() as stats, profiled(profile) as profile_result:
+        run_app()
+
+    if stats.timings or stats.counters:
+        log_event("run", stages=stats.summary(), counters=dict(stats.counters))
+        display_performance(stats, profile_result["report"])
+
+
+def run_app():
 
     st.title("IC50 Calculator")
 
+    # Jobs interrupted by a server restart continue without waiting for the next submission
+    resume_jobs()
+
+    # Historical IC50s come from the results store, not from the old workbooks
+    history_compound = st.sidebar.text_input("Compound history")
+    if history_compound:
+        st.sidebar.dataframe(query_compound(history_compound)[["created_at", "assay", "sheet", "ic50", "slope", "converged"]],
+                             hide_index=True)
+
+    # Background jobs are reopened by ID, from the sidebar or a ?job= link
+    opened_job = st.sidebar.text_input("Open job by ID", key="open_job").strip()
+    if opened_job:
+        st.query_params["job"] = opened_job
+    if st.query_params.get("job"):
+        show_job(st.query_params["job"])
+        return
+
     uploaded_file = st.file_uploader("Choose an Excel file", type="xlsx")
 
     if uploaded_file:
+        # Everything below is cached on the content of the upload
+        content_hash = file_hash(uploaded_file)
+
         # Check the available sheets in the Excel file
-        xls = pd.ExcelFile(uploaded_file)
-        sheet_names = xls.sheet_names
+        sheet_names = SHEET_CACHE.get_or_compute(content_hash, lambda: cached_sheet_names(uploaded_file, content_hash))
+
+        # Fit every sheet of the workbook one after the other, or a single chosen sheet
+        all_sheets = len(sheet_names) > 1 and st.checkbox("Process all sheets")
 
         # If multiple sheets, prompt user to select a sheet
-        if len(sheet_names) > 1:
+        if all_sheets:
+            selected_sheet = None
+        elif len(sheet_names) > 1:
             selected_sheet = st.selectbox("Choose a sheet to process", sheet_names)
         else:
             selected_sheet = sheet_names[0]
 
-        # Let user select the number of experiments
-        n_experiments = st.selectbox("Select the number of experiments:", [1, 2, 3, 4, 5, 6])
-        
-        # Update start_row based on n_experiments
-        start_row_dict = {
-            1: [44],
-            2: [44, 62],
-            3: [44, 62, 80],
-            4: [44, 62, 80, 98],
-            5: [44, 62, 80, 98, 116],
-            6: [44, 62, 80, 98, 116, 134],
-
-        }
-        start_row = start_row_dict[n_experiments]
+        # Let user select the plate layout when more than one is available
+        layout_names = list_layouts()
+        if len(layout_names) > 1:
+            layout_name = st.selectbox("Choose the plate layout", layout_names, index=layout_names.index(DEFAULT_LAYOUT))
+        else:
+            layout_name = DEFAULT_LAYOUT
+        layout = load_layout(layout_name)
+
+        # Let user select the number of experiments, or detect it from the sheet
+        max_blocks = layout["replicates"]["max_blocks"]
+        n_experiments = st.selectbox("Select the number of experiments:", ["Auto"] + list(range(1, max_blocks + 1)))
+        if n_experiments == "Auto":
+            n_experiments = None
+
+        plate_key = (content_hash, selected_sheet, layout_name, n_experiments)
+
+        # Dose-response model, or the best of 3PL, 4PL and 5PL chosen per compound
+        model_labels = {name: model.label for name, model in MODELS.items()}
+        model_labels[AUTO_MODEL] = "Automatic, best of 3PL, 4PL and 5PL per compound"
+        model = st.selectbox("Choose the model", list(model_labels), index=list(model_labels).index(DEFAULT_MODEL),
+                             format_func=model_labels.get)
+        criterion = "aicc"
+        if model == AUTO_MODEL:
+            criterion = st.radio("Select models by", ["aicc", "f"], horizontal=True,
+                                 format_func={"aicc": "AICc", "f": "F-test (p < 0.05)"}.get)
+        fit_key = plate_key + (model, criterion)
+
+        # 600-dpi PDFs are slow to render, so only prepare them on request; figures are drawn for a
+        # single sheet only, all-sheets mode streams result tables
+        export_pdf = st.checkbox("Prepare 600-dpi PDF downloads", disabled=all_sheets) and not all_sheets
+        export_report = st.checkbox("Offer the plate report (merged PDF, PNG and SVG ZIPs, built on download)",
+                                    disabled=all_sheets) and not all_sheets
+        if all_sheets:
+            st.caption("PDF and report downloads hold the figures of one plate, so they are only offered when a "
+                       "single sheet is processed. Processing all sheets gives one results table per sheet.")
+
+        # Bootstrap confidence intervals refit every compound many times, so they are optional
+        bootstrap = st.checkbox("Bootstrap 95% confidence intervals")
+        n_boot = st.number_input("Bootstrap resamples per compound", 100, 20000, 1000, step=100) if bootstrap else 0
+
+        # Plates whose controls are too noisy are reported without fitting them
+        qc_gate   = st.checkbox(f"Skip plates that fail QC (Z′ < {MIN_Z_PRIME})", value=True)
+        qc_limits = {"min_z_prime": MIN_Z_PRIME if qc_gate else None}
+
+        # Long analyses can run on the job pool instead of blocking this page
+        background = st.checkbox("Run in the background (reopen later by job ID)")
 
         # Display the "Confirm Selection" button
         confirm_button = st.button("Confirm Selection")
 
-        # Only execute the following if the confirm button is pressed
-        if confirm_button:
+        if confirm_button and background:
+            sheets = sheet_names if all_sheets else [selected_sheet]
+            settings = {"layout": layout_name, "experiments": n_experiments, "bootstrap": n_boot, "model": model,
+                        "criterion": criterion, "min_z_prime": qc_limits["min_z_prime"]}
+            st.query_params["job"] = submit_job(uploaded_file.getvalue(), uploaded_file.name, sheets, settings, content_hash)
+            st.rerun()
+
+        # Multi-sheet mode streams a summary instead of the single-plate report
+        if confirm_button and all_sheets:
+            process_all_sheets(uploaded_file, sheet_names, n_experiments, layout, content_hash, model, criterion, qc_limits,
+                               n_boot)
+            return
 
+        # The report stays on screen across reruns (e.g. excluding an outlier) until the settings change
+        if confirm_button:
+            st.session_state["confirmed"] = plate_key
 
+        # Only execute the following once the selection is confirmed
+        if st.session_state.get("confirmed") == plate_key:
 
-    # EXTRACTS ###########
-            # Extract the assay and title texts using the extract_text_data function
-            assay_text, title_text = extract_head_data(uploaded_file, selected_sheet)
 
-            # Extract compounds using the function
-            compounds = extract_compounds(uploaded_file, selected_sheet)
-        
-            # Extract concentrations using the function
-            concentrations = extract_concentrations(uploaded_file, selected_sheet)
 
-            # Extract Y label using the function
-            y_label = extract_ylabel(uploaded_file, selected_sheet)
+    # EXTRACTS ###########
+            # Parse the selected sheet once, or reuse the plate parsed on an earlier rerun; plates parsed
+            # in earlier sessions are memory-mapped from their sidecar instead of read from Excel
+            count("cache.plate_hits" if plate_key in PLATE_CACHE else "cache.plate_misses")
+            plate = PLATE_CACHE.get_or_compute(plate_key, lambda: cached_plate(uploaded_file, selected_sheet, n_experiments,
+                                                                                layout, content_hash))
 
-            # Extract experimental data using the function
-            experiments_data = []
-            for idx in range(n_experiments):
-                exp_data = extract_experiment(uploaded_file, selected_sheet, start_row= start_row[idx])
-                experiments_data.append(exp_data)
+            compounds              = plate.names
 
 
 
@@ -107,133 +258,151 @@ def main():
 
     # DISPLAY ###########
 
-            # Display the extracted texts using the display_text_data function
-            display_head_data(assay_text, title_text)
-
-            # Use the function to display the compounds in Streamlit
-            colored_indices, combined_colors = display_compounds(compounds[0])
+            with timer("display.tables"):
+                # Display the extracted texts using the display_text_data function
+                display_head_data(plate.assay_text, plate.title_text)
 
+                # Use the function to display the compounds in Streamlit
+                display_compounds(plate.names, plate.roles)
 
-            # Display the extracted data using the display function
-            display_concentrations(concentrations, colored_indices, combined_colors)
 
+                # Every plate table is one st.dataframe styled from a precomputed matrix
+                display_concentrations(plate.concentrations, plate.roles)
+                display_experiments(plate.responses, plate.roles)
+                display_heatmap(plate.mean)
 
-            for idx, exp_data in enumerate(experiments_data, 1):
-                display_experiment(exp_data, number=idx)
+            # Control statistics once per plate; a failed plate stops here, before any fitting or rendering
+            with timer("qc"):
+                qc = plate_qc(plate, **qc_limits)
+            display_qc(qc)
+            if not qc.passed:
+                count("qc.failed_plates")
+                return
 
 
     # Plotting #########
 
-            control_idx, mocks_idx, none_idx, filtered_compounds = filter_compounds(compounds[1])
-            compounds = np.array(compounds[1])
-
-            x_axis                 = np.array(concentrations)
-            experiments_data       = np.array(experiments_data)
+            log_event("plate", sheet=selected_sheet, concentrations=plate.concentrations.shape,
+                      experiments=plate.responses.shape, mocks=plate.wells(MOCK).tolist())
+
+            # Points excluded as outliers with the selector under each plot
+            # The selections are also kept outside the widgets, whose state is dropped while their page is not shown
+            mask_prefix = f"exclude_{content_hash[:12]}_{selected_sheet}_{layout_name}"
+            exclusions  = st.session_state.setdefault(mask_prefix, {})
+            mask = np.ones(plate.concentrations.shape, dtype=bool)
+            for i in plate.fitted_wells:
+                mask[exclusions.get(i, []), i] = False
+            excluded = tuple(map(tuple, np.argwhere(~mask).tolist()))
+
+            # Fit every well of the plate in one batch; only wells whose data or mask changed are refitted,
+            # starting from their previous optimum
+            latest_key = ("latest", content_hash, selected_sheet, layout_name)
+            fits  = fit_extracted_plate(plate, mask, previous=FIT_CACHE.get(latest_key), model=model, criterion=criterion,
+                                        max_workers=None)
+            FIT_CACHE.put(latest_key, fits)
+            mocks = mock_curves(plate)
+
+            # Results table, with bootstrap confidence intervals when requested
+            ci = None
+            if n_boot:
+                with st.spinner("Bootstrapping confidence intervals..."):
+                    ci = FIT_CACHE.get_or_compute(fit_key + ("bootstrap", n_boot, excluded), lambda: bootstrap_plate(
+                        plate.x_log, np.where(mask, plate.responses, np.nan), fits, plate.fitted_wells,
+                        n_boot=n_boot, seed=0))
+            records = plate_records(plate, fits, ci, qc, file=uploaded_file.name, sheet=selected_sheet)
+            st.markdown("## Results")
+            st.dataframe(pd.DataFrame(records), hide_index=True)
+            st.download_button("Download results CSV", pd.DataFrame(records).to_csv(index=False),
+                               file_name=f"{safe_name(selected_sheet)}_ic50.csv", mime="text/csv")
+
+            # Whole-plate report, each file built on click; the PDF is drawn page by page in the
+            # server process and the figure ZIPs render on the worker pool
+            if export_report:
+                report_jobs = compound_jobs(plate, fits, mask)
+                stem = safe_name(selected_sheet)
+                pdf_col, png_col, svg_col = st.columns(3)
+                pdf_col.download_button("Report PDF", deferred_report(write_report_pdf, report_jobs),
+                                        file_name=f"{stem}.pdf", mime="application/pdf")
+                png_col.download_button("Figures (PNG)", deferred_report(write_figures_zip, report_jobs, "png"),
+                                        file_name=f"{stem}_png.zip", mime="application/zip")
+                svg_col.download_button("Figures (SVG)", deferred_report(write_figures_zip, report_jobs, "svg"),
+                                        file_name=f"{stem}_svg.zip", mime="application/zip")
+
+            # Keep every fit in the results store for cross-plate queries
+            settings = fit_settings(layout_name, plate.n_replicates, n_boot, model, criterion)
+            if excluded:
+                settings["excluded"] = excluded
+            try:
+                with timer("store"):
+                    store_fits(records, fits, content_hash, settings)
+            except sqlite3.Error as err:
+                st.warning(f"Could not save the results: {err}")
+
+            # Only one page of compounds is plotted at a time
+            fitted = plate.fitted_wells.tolist()
+            pages  = [fitted[start:start + PLOTS_PER_PAGE] for start in range(0, len(fitted), PLOTS_PER_PAGE)]
+            page   = 0
+            if len(pages) > 1:
+                page = st.selectbox("Compounds to plot", range(len(pages)), key=f"page_{mask_prefix}",
+                                    format_func=lambda k: f"Wells {pages[k][0] + 1}-{pages[k][-1] + 1} (page {k + 1} of {len(pages)})")
+
+            # One slot per compound, in plate order, filled as its figure finishes rendering
+            slots     = {}
+            plot_jobs = {}
+            fig_keys  = {}
+
+            for i in pages[page] if pages else []:
+
+                xdata = plate.x_log[:, i]
+                ydata = plate.mean[:, i]
+                yerr  = plate.std[:, i]
+
+                popt       = fits.params[i]
+                IC50       = 10 ** log_half_max(popt)
+
+                # Log the fitted parameters
+                log_event("fit", logging.DEBUG, compound=compounds[i], bottom=popt[0], top=popt[1],
+                          log_ic50=popt[2], ic50=IC50, slope=popt[3], asymmetry=popt[4], model=str(fits.model[i]),
+                          converged=bool(fits.converged[i]))
+
+                # Reserve the place of the plot in the page
+                with st.container():
+                    slots[i] = (st.empty(), st.empty())
+                    st.multiselect("Exclude points", list(range(plate.n_conc)), default=exclusions.get(i, []),
+                                   key=f"{mask_prefix}_{i}", on_change=remember_exclusions,
+                                   args=(exclusions, f"{mask_prefix}_{i}", i),
+                                   format_func=lambda k, i=i: f"{plate.concentrations[k, i]:.3g} uM")
+                    st.write("")  # Add an empty line as padding
+                    st.write("---")  # Draw a line for better separation (optional)
+                    st.write("")  # Add another empty line as padding
 
-            print(x_axis.shape)
-            print(experiments_data.shape)
-            print(mocks_idx)
-            
-            #print(experiments_data.shape)
-            #print(experiments_data[0,:,0])
+                plot_jobs[i] = (xdata, ydata, yerr, popt, compounds[i], plate.y_label, mocks, ~mask[:, i])
+                fig_keys[i]  = fit_key + (i, tuple(np.flatnonzero(~mask[:, i]).tolist()))
 
-            CNAME_LIST   = []
-            IC50_LIST    = []
-            SLOPE_LIST   = []
-            PDFNAME_LIST = []
 
+            # Low resolution previews: cached ones appear at once, the rest stream in from the render pool
+            missing = {}
+            for i, job in plot_jobs.items():
+                image = FIGURE_CACHE.get(fig_keys[i] + ("png",))
+                if image is None:
+                    missing[i] = job
+                else:
+                    slots[i][0].image(image)
 
+            for i, image in render_compounds(missing, "png", PREVIEW_DPI):
+                FIGURE_CACHE.put(fig_keys[i] + ("png",), image)
+                slots[i][0].image(image)
 
-            for i in range(x_axis.shape[1]):
 
-                if i in mocks_idx or i in none_idx:
-                    continue
+            # Full resolution PDFs are only rendered when requested
+            if export_pdf:
+                missing = {i: job for i, job in plot_jobs.items() if fig_keys[i] + ("pdf",) not in FIGURE_CACHE}
+                for i, pdf in render_compounds(missing, "pdf", EXPORT_DPI):
+                    FIGURE_CACHE.put(fig_keys[i] + ("pdf",), pdf)
 
-                else:
-                    xdata = np.log10(x_axis[:,i]*1e-6)
-                    ydata = np.mean(experiments_data[:, :, i], axis=0)
-                    yerr  = np.std(experiments_data[:, :, i], axis=0)
-
-                    # Use curve_fit to fit the function to the data
-                    p0         = (min(ydata),max(ydata), compute_x_at_ymid(xdata, ydata), -1)  # initial guess for parameters a, b, c, and d
-                    popt, pcov = curve_fit(variable_slope_log_inhibitor_response, xdata, ydata, p0, method="lm", maxfev=100000)
-                    IC50       = 10 ** popt[2]
-                    
-                    # Appending to list
-                    IC50_LIST.append(str(np.round(IC50,8)))
-                    SLOPE_LIST.append(str(np.round(popt[3],8)))
-                    CNAME_LIST.append(compounds[idx])
-                    
-                    # Print the fitted parameters
-                    print('Bottom  =', popt[0])
-                    print('Top     =', popt[1])
-                    print('LogIC50 =', popt[2])
-                    print('IC50    =', 10 ** popt[2])
-                    print('Slope   =', popt[3])
-
-
-                    # Generate the fitted curve using the fitted parameters
-                    xfit = np.linspace(min(xdata), max(xdata), num=1000)
-                    yfit = variable_slope_log_inhibitor_response(xfit, *popt)
-
-
-
-                    # Plot the data
-                    fig, ax = plt.subplots()
-                    plt.plot(xdata, ydata, 'ro', markersize=15, color="red", label="Response")
-                    plt.errorbar(xdata, ydata, yerr=yerr, linestyle='None', capsize=6, capthick=2, elinewidth=1, color="red")
-
-                    # Plot the fitted curve
-                    plt.plot(xfit, yfit, 'b-', color="red", lw=3)
-
-                    # Plot Mocks
-                    #If there are more than 2 mocks only the first and the last one will be plotted
-
-                    # Mock A
-                    m1      = np.mean(experiments_data[:, :, mocks_idx[0]], axis=0)
-                    m1_err  = np.std (experiments_data[:, :, mocks_idx[0]], axis=0)
-                    
-                    
-                    # Mock P right
-                    m3      = np.mean(experiments_data[:, :, mocks_idx[-1]], axis=0)
-                    m3_err  = np.std (experiments_data[:, :, mocks_idx[-1]], axis=0)
-
-                    plt.plot(xdata, m1, 'ro', markersize=15, color="blue", label="mock A", zorder=0, alpha=0.5)
-                    plt.errorbar(xdata, m1, yerr=m1_err, linestyle='None', capsize=6, capthick=2, elinewidth=1, color="blue", zorder=0, alpha=0.5)
-                    
-                    #plt.plot(xdata, m2, 'ro', markersize=15, color="brown", label="mock P", zorder=0, alpha=0.5)
-                    #plt.errorbar(xdata, m2, yerr=m2_err, linestyle='None', capsize=6, capthick=2, elinewidth=1, color="brown", zorder=0, alpha=0.5)
-                    
-                    plt.plot(xdata, m3, 'ro', markersize=15, color="black", label="mock P right", zorder=0, alpha=0.5)
-                    plt.errorbar(xdata, m3, yerr=m3_err, linestyle='None', capsize=6, capthick=2, elinewidth=1, color="black", zorder=0, alpha=0.5)
-
-                    plt.title(compounds[i], pad=20, size=25, weight = 'bold')
-
-                    # Add a legend and axis labels
-                    plt.xlabel('Compound [$log_{10}(M)$]',weight = 'bold', size=30)
-                    plt.ylabel(y_label,weight = 'bold', size=30)
-                    plt.ylim(0,200)
-                    plt.xlim(-9,-3)
-                    plt.xticks(weight = 'bold', size=30)
-                    plt.yticks(weight = 'bold', size=25)
-
-                    # Text
-                    plt.text(-6, 160, "IC50="+str( '%.2E' % Decimal(IC50*1e6))+" $\mu  M$", weight = 'bold')
-
-                    plt.legend(frameon=False, ncol=3, loc="upper left")
-
-                    #plt.savefig("PDF/"+compounds[i]+".pdf", format="pdf", dpi=300, bbox_inches='tight')
-                    
-                    PDFNAME_LIST.append(compounds[i]+".pdf")
-
-
-
-                    # Display the plot in Streamlit
-                    st.pyplot(fig)
-                    plt.close()  # Clear the current figure
-                    st.write("")  # Add an empty line as padding
-                    st.write("---")  # Draw a line for better separation (optional)
-                    st.write("")  # Add another empty line as padding
+                for i in plot_jobs:
+                    slots[i][1].download_button("Download PDF", FIGURE_CACHE.get(fig_keys[i] + ("pdf",)),
+                                                file_name=compounds[i]+".pdf", mime="application/pdf", key=f"pdf_{i}")
 
 
 
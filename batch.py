@@ -0,0 +1,254 @@
+# Importing Libraries
+import argparse
+import glob
+import logging
+import os
+import sys
+from concurrent.futures import as_completed
+from lib.extract import list_sheets
+from lib.layout import load_layout, DEFAULT_LAYOUT
+from lib.pipeline import extract_plate, fit_extracted_plate, check_plate, plate_records, plate_curves, global_records
+from lib.qc import MIN_Z_PRIME, QCFailure
+from lib.bootstrap import bootstrap_plate
+from lib.cache import file_hash
+from lib.store import store_fits, fit_settings
+from lib.sidecar import cached_plate, cached_sheet_names, convert_workbook
+from lib.models import MODELS, DEFAULT_MODEL, AUTO_MODEL
+from lib.export import safe_name, compound_jobs, write_report_pdf, write_figures_zip, write_table
+from lib.instrument import configure_logging, log_event, collect, timer
+from lib.workers import process_pool
+
+
+def find_workbooks(inputs):
+    """
+    Expand directories and glob patterns into a sorted list of .xlsx files.
+
+    Parameters:
+    - inputs: List of directories, files or glob patterns.
+
+    Returns:
+    - Sorted list of workbook paths.
+    """
+    paths = set()
+    for item in inputs:
+        if os.path.isdir(item):
+            paths.update(glob.glob(os.path.join(item, "*.xlsx")))
+        else:
+            paths.update(glob.glob(item))
+
+    # Skip the lock files Excel leaves next to open workbooks
+    return sorted(p for p in paths if p.endswith(".xlsx") and not os.path.basename(p).startswith("~$"))
+
+
+def write_pdfs(plate, fits, pdf_dir):
+    """
+    Save one PDF per fitted compound of a plate.
+
+    Parameters:
+    - plate: Plate returned by extract_plate.
+    - fits: BatchFit for the plate.
+    - pdf_dir: Directory the PDFs are written to.
+    """
+    from lib.plot import plot_compound
+
+    os.makedirs(pdf_dir, exist_ok=True)
+    for stem, job in compound_jobs(plate, fits).items():
+        with timer("render.pdf", figure=stem):
+            plot_compound(*job).savefig(os.path.join(pdf_dir, f"{stem}.pdf"), format="pdf", dpi=300, bbox_inches='tight')
+
+
+def write_report(plate, fits, records, report_dir, figure_format="png"):
+    """
+    Save the report of one plate: a merged multi-page PDF, a ZIP of per-compound figures and a results CSV.
+
+    Parameters:
+    - plate: Plate returned by extract_plate.
+    - fits: BatchFit for the plate.
+    - records: Result rows of the plate.
+    - report_dir: Directory the files are written to, named after the sheet.
+    - figure_format: Format of the figures in the ZIP ("png" or "svg").
+    """
+    os.makedirs(report_dir, exist_ok=True)
+    stem = os.path.join(report_dir, safe_name(plate.sheet))
+    jobs = compound_jobs(plate, fits)
+
+    write_report_pdf(jobs, stem + ".pdf")
+    # Sheets already run in parallel, so the figures are rendered in this worker
+    write_figures_zip(jobs, f"{stem}_{figure_format}.zip", figure_format, parallel=False)
+    write_table(records, stem + ".csv")
+
+
+def process_sheet(path, sheet, n_experiments, layout, pdf_dir=None, n_boot=0, store=None, report_dir=None,
+                  figure_format="png", sidecar_dir=None, source_hash=None, model=DEFAULT_MODEL, criterion="aicc",
+                  min_z_prime=None):
+    """
+    Extract and fit one sheet; runs inside a worker process.
+
+    Parameters:
+    - path: Workbook path.
+    - sheet: Sheet name.
+    - n_experiments: Number of experiment blocks to read, or None to detect them.
+    - layout: Loaded plate layout.
+    - pdf_dir: Optional root directory for per-compound PDFs.
+    - n_boot: Bootstrap resamples per compound for 95% CIs; 0 to skip.
+    - store: Optional results database the fits are appended to.
+    - report_dir: Optional root directory for the merged PDF, figure ZIP and CSV of every sheet.
+    - figure_format: Format of the figures in the report ZIP.
+    - sidecar_dir: Optional sidecar directory; the sheet is parsed from Excel only if it has no sidecar yet.
+    - source_hash: SHA-256 of the workbook, computed if omitted.
+    - model: Model name, or "auto" to choose the best model per compound.
+    - criterion: Model selection criterion of "auto", "aicc" or "f".
+    - min_z_prime: Plates whose Z'-factor is lower fail QC and are neither fitted nor reported; None to keep all.
+
+    Returns:
+    - Tuple of (result rows, compound curves for global_records) for the sheet.
+    """
+    with collect() as stats:
+        source_hash = source_hash or file_hash(path)
+        if sidecar_dir:
+            plate = cached_plate(path, sheet, n_experiments, layout, source_hash, sidecar_dir)
+        else:
+            plate = extract_plate(path, sheet, n_experiments, layout)
+        qc = check_plate(plate, min_z_prime=min_z_prime)
+        fits = fit_extracted_plate(plate, model=model, criterion=criterion)
+
+        if pdf_dir:
+            write_pdfs(plate, fits, os.path.join(pdf_dir, safe_name(os.path.splitext(os.path.basename(path))[0]), safe_name(sheet)))
+
+        # Sheets already run in parallel, so the bootstrap stays in this worker
+        ci = None
+        if n_boot:
+            ci = bootstrap_plate(plate.x_log, plate.responses, fits, plate.fitted_wells, n_boot=n_boot, seed=0,
+                                 max_workers=1)
+
+        records = plate_records(plate, fits, ci, qc, file=path, sheet=sheet)
+        if store:
+            store_fits(records, fits, source_hash,
+                       fit_settings(layout["name"], plate.n_replicates, n_boot, model, criterion), store)
+
+        if report_dir:
+            write_report(plate, fits, records, os.path.join(report_dir, safe_name(os.path.splitext(os.path.basename(path))[0])),
+                         figure_format)
+
+    log_event("sheet_done", file=path, sheet=sheet, fits=len(records), stages=stats.summary(), counters=dict(stats.counters))
+    return records, plate_curves(plate)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Fit IC50 curves for every sheet of every plate workbook.")
+    parser.add_argument("inputs", nargs="+", help="Directories, .xlsx files or glob patterns.")
+    parser.add_argument("-o", "--output", default="ic50_results.csv", help="Results table (.csv or .parquet).")
+    parser.add_argument("-n", "--experiments", type=int, default=None,
+                        help="Number of experiment blocks per sheet (detected from each sheet by default).")
+    parser.add_argument("-l", "--layout", default=DEFAULT_LAYOUT, help="Bundled layout name or path to a layout JSON file.")
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count(), help="Worker processes.")
+    parser.add_argument("--pdf-dir", default=None, help="Write per-compound PDFs under this directory.")
+    parser.add_argument("--report-dir", default=None,
+                        help="Write a merged multi-page PDF, a ZIP of per-compound figures and a CSV for every sheet under this directory.")
+    parser.add_argument("--figure-format", choices=["png", "svg"], default="png", help="Format of the figures in the report ZIP.")
+    parser.add_argument("--bootstrap", type=int, default=0, metavar="N",
+                        help="Add 95%% bootstrap CIs of IC50 and slope from N resamples per compound.")
+    parser.add_argument("-m", "--model", choices=list(MODELS) + [AUTO_MODEL], default=DEFAULT_MODEL,
+                        help="Dose-response model; 'auto' picks the best of 3PL, 4PL and 5PL for every compound.")
+    parser.add_argument("--criterion", choices=["aicc", "f"], default="aicc",
+                        help="How 'auto' chooses the model: lowest AICc, or an extra-sum-of-squares F-test at p < 0.05.")
+    parser.add_argument("--qc", dest="min_z_prime", action="store_const", const=MIN_Z_PRIME, default=None,
+                        help=f"Skip sheets whose controls give a Z'-factor below {MIN_Z_PRIME}; off by default.")
+    parser.add_argument("--min-z-prime", type=float, metavar="Z", help="Like --qc with another Z'-factor limit.")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Log every stage timing.")
+    parser.add_argument("--global-fit", default=None, metavar="TABLE",
+                        help="Also fit each compound found on several sheets jointly (shared LogIC50 and slope, "
+                             "per-plate bottom and top) and write one row per compound to TABLE (.csv or .parquet).")
+    parser.add_argument("--sidecar-dir", default=None, metavar="DIR",
+                        help="Keep every parsed sheet as memory-mapped .npy sidecars keyed by file hash, and "
+                             "load sheets from there instead of Excel on later runs.")
+    parser.add_argument("--convert-only", action="store_true",
+                        help="Only write the sidecars of every workbook (needs --sidecar-dir); no fitting.")
+    parser.add_argument("--store", default=None, metavar="DB", help="Also append every fit to this SQLite results store.")
+    return parser.parse_args(argv)
+
+
+def convert_workbooks(workbooks, hashes, args):
+    """Write the sidecars of every sheet of every workbook, one workbook per worker."""
+    log_event("convert_start", workbooks=len(workbooks), workers=args.workers)
+    failures = 0
+    with process_pool(args.workers) as pool:
+        futures = {pool.submit(convert_workbook, path, args.experiments, args.layout, hashes[path], args.sidecar_dir): path
+                   for path in workbooks}
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                errors = future.result()
+                cached_sheet_names(path, hashes[path], args.sidecar_dir)
+            except Exception as err:
+                errors = {None: err}
+            for sheet, error in errors.items():
+                if error is not None:
+                    failures += 1
+                    log_event("convert_failed", logging.ERROR, file=path, sheet=sheet, error=str(error))
+    log_event("convert_done", workbooks=len(workbooks), failed=failures)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    configure_logging(logging.DEBUG if args.verbose else logging.INFO)
+    layout = load_layout(args.layout)
+
+    workbooks = find_workbooks(args.inputs)
+    if not workbooks:
+        sys.exit("No .xlsx files found.")
+
+    hashes = {path: file_hash(path) for path in workbooks}
+
+    if args.convert_only:
+        if not args.sidecar_dir:
+            sys.exit("--convert-only needs --sidecar-dir.")
+        convert_workbooks(workbooks, hashes, args)
+        return
+
+    if args.sidecar_dir:
+        tasks = [(path, sheet) for path in workbooks for sheet in cached_sheet_names(path, hashes[path], args.sidecar_dir)]
+    else:
+        tasks = [(path, sheet) for path in workbooks for sheet in list_sheets(path)]
+    log_event("batch_start", sheets=len(tasks), workbooks=len(workbooks), workers=args.workers)
+
+    records = []
+    curves = []
+    failures = 0
+    qc_failures = 0
+    with process_pool(args.workers) as pool:
+        futures = {pool.submit(process_sheet, path, sheet, args.experiments, layout, args.pdf_dir, args.bootstrap, args.store,
+                               args.report_dir, args.figure_format, args.sidecar_dir, hashes[path], args.model,
+                               args.criterion, args.min_z_prime): (path, sheet)
+                   for path, sheet in tasks}
+        for future in as_completed(futures):
+            path, sheet = futures[future]
+            try:
+                sheet_records, sheet_curves = future.result()
+                records.extend(sheet_records)
+                curves.extend(sheet_curves)
+            except QCFailure as err:
+                # A rejected plate is a result of the run, not an error
+                qc_failures += 1
+                log_event("sheet_failed_qc", logging.WARNING, file=path, sheet=sheet, reasons=err.reasons, **err.summary)
+            except Exception as err:
+                # One broken sheet must not stop an overnight run
+                failures += 1
+                log_event("sheet_failed", logging.ERROR, file=path, sheet=sheet, error=str(err))
+
+    # Keep the table in input order regardless of completion order
+    order = {task: idx for idx, task in enumerate(tasks)}
+    records.sort(key=lambda row: (order[(row["file"], row["sheet"])], row["well"]))
+
+    write_table(records, args.output)
+
+    if args.global_fit:
+        compounds = global_records(curves)
+        write_table(compounds, args.global_fit)
+        log_event("global_fit_done", compounds=len(compounds), output=args.global_fit)
+
+    log_event("batch_done", fits=len(records), output=args.output, failed_sheets=failures, qc_failed_sheets=qc_failures)
+
+
+if __name__ == "__main__":
+    main()
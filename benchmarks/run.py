@@ -0,0 +1,212 @@
+# Importing Libraries
+import argparse
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+from benchmarks.synthetic import make_workbook
+from lib.extract import (PlateReader, count_experiments, extract_head_data, extract_compounds,
+                         extract_concentrations, extract_ylabel, extract_experiment)
+from lib.cache import WELL_FIT_CACHE
+from lib.layout import experiment_start_rows, DEFAULT_LAYOUT
+from lib.pipeline import extract_plate, iter_workbook_results
+from lib.tools import fit_plate, variable_slope_log_inhibitor_response
+from lib.workers import process_pool
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far, in MB; every case runs in its own process."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak / 1e6 if sys.platform == "darwin" else peak / 1e3
+
+
+def peak_alloc_mb(func):
+    """
+    Peak memory allocated during one untimed call of `func`, in MB.
+
+    tracemalloc sees NumPy arrays as well as Python objects, and it is only switched on
+    here, so the timings are not slowed down by it.
+    """
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1] / 1e6
+    finally:
+        tracemalloc.stop()
+
+
+def timed(func, repeat=1):
+    """Run `func` `repeat` times and return (best wall time in seconds, last result)."""
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def bench_extract(path, sheet, n_experiments, layout, repeat):
+    """Time the single sheet parse and every extract_* view separately."""
+    parse, reader = timed(lambda: PlateReader(path, sheet, layout), repeat)
+    start_rows = experiment_start_rows(reader.layout, n_experiments)
+    return {
+        "parse_s": parse,
+        "head_data_s": timed(lambda: extract_head_data(reader), repeat)[0],
+        "compounds_s": timed(lambda: extract_compounds(reader), repeat)[0],
+        "concentrations_s": timed(lambda: extract_concentrations(reader), repeat)[0],
+        "ylabel_s": timed(lambda: extract_ylabel(reader), repeat)[0],
+        "experiments_s": timed(lambda: [extract_experiment(reader, start_row=row) for row in start_rows], repeat)[0],
+        "count_experiments_s": timed(lambda: count_experiments(reader), repeat)[0],
+    }
+
+
+def legacy_x_at_ymid(x, y):
+    """The initial log IC50 guess of the app before the batch fitter: x at the mid response, by interp1d."""
+    from scipy.interpolate import interp1d
+
+    y_mid = np.mean([np.max(y), np.min(y)])
+    return interp1d(y, x)(y_mid)
+
+
+def curve_fit_loop(x_log, experiments_data, wells):
+    """The per-compound curve_fit loop the app used before the batch fitter, kept as a reference."""
+    from scipy.optimize import curve_fit
+
+    failures = 0
+    for i in wells:
+        xdata = x_log[:, i]
+        ydata = np.mean(experiments_data[:, :, i], axis=0)
+        try:
+            p0 = (min(ydata), max(ydata), legacy_x_at_ymid(xdata, ydata), -1)
+            curve_fit(variable_slope_log_inhibitor_response, xdata, ydata, p0, method="lm", maxfev=100000)
+        except (ValueError, RuntimeError):
+            failures += 1
+    return failures
+
+
+def bench_fit(plate, repeat):
+    """Time the legacy curve_fit loop and the batch fitter on the same wells."""
+    x_log = plate.x_log
+    experiments_data = plate.responses
+    wells = plate.fitted_wells
+
+    with np.errstate(all="ignore"):
+        loop_s, failures = timed(lambda: curve_fit_loop(x_log, experiments_data, wells), repeat)
+        batch_s, fits = timed(lambda: fit_plate(x_log[:, wells], experiments_data[:, :, wells]), repeat)
+
+    return {
+        "wells": len(wells),
+        "curve_fit_loop_s": loop_s,
+        "curve_fit_fits_per_s": len(wells) / loop_s,
+        "curve_fit_failures": failures,
+        "batch_s": batch_s,
+        "batch_fits_per_s": len(wells) / batch_s,
+        "batch_converged": int(fits.converged.sum()),
+    }
+
+
+def bench_render(plate, dpi, n_figures):
+    """Time building and rasterising compound figures at the given resolution."""
+    from lib.plot import plot_compound, figure_png
+
+    wells = plate.fitted_wells[:n_figures]
+    fits = fit_plate(plate.x_log, plate.responses)
+
+    def render():
+        for i in wells:
+            fig = plot_compound(plate.x_log[:, i], plate.mean[:, i], plate.std[:, i],
+                                fits.params[i], f"well {i + 1}", "% Activity")
+            figure_png(fig, dpi)
+
+    elapsed, _ = timed(render)
+    return {"dpi": dpi, "figures": len(wells), "render_s": elapsed, "figures_per_s": len(wells) / elapsed,
+            "peak_alloc_mb": peak_alloc_mb(render)}
+
+
+def run_case(workdir, n_experiments, n_sheets, noise, n_compounds, layout, repeat, render_dpi, render_figures):
+    """
+    Generate one synthetic workbook and benchmark every stage on it.
+
+    Each stage reports the peak memory it allocated itself (peak_alloc_mb); the case reports
+    the peak RSS of its process, so main runs every case in a fresh process.
+    """
+    path = os.path.join(workdir, f"bench_{layout}_{n_experiments}x{n_sheets}_{noise}.xlsx")
+    make_workbook(path, n_experiments, n_sheets, noise, n_compounds, layout)
+    sheet = "Plate 1"
+
+    case = {"layout": layout, "experiments": n_experiments, "sheets": n_sheets, "noise": noise, "compounds": n_compounds,
+            "file_mb": os.path.getsize(path) / 1e6}
+
+    case["extract"] = bench_extract(path, sheet, n_experiments, layout, repeat)
+    case["extract"]["peak_alloc_mb"] = peak_alloc_mb(lambda: extract_plate(path, sheet, n_experiments, layout))
+
+    plate = extract_plate(path, sheet, n_experiments, layout)
+    case["fit"] = bench_fit(plate, repeat)
+    wells = plate.fitted_wells
+    case["fit"]["peak_alloc_mb"] = peak_alloc_mb(lambda: fit_plate(plate.x_log[:, wells], plate.responses[:, :, wells]))
+
+    # Whole-workbook streaming: parse, fit and tabulate every sheet, without reusing earlier fits
+    def stream():
+        WELL_FIT_CACHE.clear()
+        return sum(result.error is not None for result in iter_workbook_results(path, n_experiments, layout))
+
+    elapsed, failed = timed(stream)
+    case["workbook"] = {"all_sheets_s": elapsed, "sheets_per_s": n_sheets / elapsed, "failed_sheets": failed,
+                        "peak_alloc_mb": peak_alloc_mb(stream)}
+
+    if render_figures:
+        case["render"] = bench_render(plate, render_dpi, render_figures)
+
+    case["peak_rss_mb"] = peak_rss_mb()
+    return case
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the extract, fit and render stages on synthetic plates.")
+    parser.add_argument("-o", "--output", default="bench_results.json", help="JSON file the results are written to.")
+    parser.add_argument("-n", "--experiments", type=int, nargs="+", default=[1, 3, 6], help="Replicate counts to test.")
+    parser.add_argument("-s", "--sheets", type=int, nargs="+", default=[1], help="Sheets per workbook to test.")
+    parser.add_argument("--noise", type=float, nargs="+", default=[3.0], help="Response noise levels to test.")
+    parser.add_argument("--compounds", type=int, default=None, help="Compound wells per plate (all by default).")
+    parser.add_argument("-l", "--layout", nargs="+", default=[DEFAULT_LAYOUT], help="Plate layouts to test.")
+    parser.add_argument("--repeat", type=int, default=3, help="Repeats per timing; the best is kept.")
+    parser.add_argument("--render-dpi", type=int, default=100, help="Resolution of the render benchmark.")
+    parser.add_argument("--render-figures", type=int, default=8, help="Figures rendered per case (0 to skip).")
+    args = parser.parse_args(argv)
+
+    results = {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "started": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "cases": [],
+    }
+
+    with tempfile.TemporaryDirectory() as workdir:
+        for layout in args.layout:
+            for n_experiments in args.experiments:
+                for n_sheets in args.sheets:
+                    for noise in args.noise:
+                        # A fresh process per case, so its peak RSS is not inherited from earlier cases
+                        with process_pool(1) as pool:
+                            case = pool.submit(run_case, workdir, n_experiments, n_sheets, noise, args.compounds,
+                                               layout, args.repeat, args.render_dpi, args.render_figures).result()
+                        results["cases"].append(case)
+                        print(f"{layout} n={n_experiments} sheets={n_sheets} noise={noise}: "
+                              f"parse {case['extract']['parse_s']:.3f}s, "
+                              f"batch {case['fit']['batch_fits_per_s']:.0f} fits/s, "
+                              f"curve_fit {case['fit']['curve_fit_fits_per_s']:.0f} fits/s", file=sys.stderr)
+
+    with open(args.output, "w") as handle:
+        json.dump(results, handle, indent=2)
+
+
+if __name__ == "__main__":
+    main()
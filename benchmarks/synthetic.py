@@ -0,0 +1,114 @@
+# Importing Libraries
+import argparse
+import numpy as np
+from openpyxl import Workbook
+from lib.layout import load_layout, replicate_offsets, DEFAULT_LAYOUT
+
+
+def synthetic_plate(layout, n_experiments, noise=3.0, n_compounds=None, rng=None):
+    """
+    Generate the contents of one plate with known dose-response curves.
+
+    The first and last well are mocks, the second-to-last is MEK and wells beyond
+    `n_compounds` are left empty (NONE).
+
+    Parameters:
+    - layout: A loaded layout.
+    - n_experiments: Number of replicate blocks.
+    - noise: Std of the Gaussian noise added to every response.
+    - n_compounds: Number of compound wells to fill; all remaining wells by default.
+    - rng: numpy Generator.
+
+    Returns:
+    - Tuple of (names, concentrations (n_conc,), responses (n_experiments, n_conc, n_wells), log_ic50 (n_wells,)).
+    """
+    rng = rng or np.random.default_rng()
+    n_wells, n_conc = layout["n_wells"], layout["n_conc"]
+
+    names = np.array([f"CPD-{i + 1}" for i in range(n_wells)], dtype=object)
+    if n_compounds is not None:
+        names[n_compounds + 1:] = "NONE"
+    names[0] = names[-1] = "MOCK"
+    names[-2] = "MEK"
+
+    concentrations = 100 / 3 ** np.arange(n_conc)
+    x = np.log10(concentrations * 1e-6)
+    log_ic50 = rng.uniform(-7.5, -4.5, n_wells)
+    slope = -rng.uniform(0.7, 1.5, n_wells)
+    curves = 5 + 95 / (1 + 10 ** ((log_ic50[None, :] - x[:, None]) * slope[None, :]))
+    curves[:, names == "MOCK"] = 100
+    curves[:, names == "MEK"] = 5
+    curves[:, names == "NONE"] = 0
+
+    responses = curves[None] + rng.normal(0, noise, (n_experiments, n_conc, n_wells))
+    return names, concentrations, responses, log_ic50
+
+
+def write_ranges(worksheet, ranges, values, row_offset=0):
+    """Write a (n_conc, n_wells) array into layout ranges, wells along the rows of each range."""
+    well = 0
+    for first_row, first_col, n_rows, n_cols in ranges:
+        for r in range(n_rows):
+            for c in range(n_cols):
+                worksheet.cell(first_row + row_offset + r + 1, first_col + c + 1, float(values[c, well]))
+            well += 1
+
+
+def make_workbook(path, n_experiments=3, n_sheets=1, noise=3.0, n_compounds=None, layout=DEFAULT_LAYOUT, seed=0):
+    """
+    Write a synthetic workbook laid out like the real plate exports.
+
+    Parameters:
+    - path: Output .xlsx path.
+    - n_experiments: Replicate blocks per sheet.
+    - n_sheets: Number of plates (sheets).
+    - noise: Std of the response noise.
+    - n_compounds: Compound wells to fill per plate.
+    - layout: Layout name, path or dictionary.
+    - seed: Random seed.
+
+    Returns:
+    - List with the true log10 IC50 of every well, one array per sheet.
+    """
+    layout = load_layout(layout)
+    rng = np.random.default_rng(seed)
+    workbook = Workbook()
+    workbook.remove(workbook.active)
+
+    truth = []
+    for sheet in range(n_sheets):
+        worksheet = workbook.create_sheet(f"Plate {sheet + 1}")
+        names, concentrations, responses, log_ic50 = synthetic_plate(layout, n_experiments, noise, n_compounds, rng)
+        truth.append(log_ic50)
+
+        for key, text in (("assay", "Synthetic assay"), ("title", f"Plate {sheet + 1}"), ("y_label", "% Activity")):
+            row, col = layout[key + "_cell"]
+            worksheet.cell(row + 1, col + 1, text)
+
+        well = 0
+        for first_row, first_col, n_rows, n_cols in layout["compound_ranges"]:
+            for r in range(n_rows):
+                for c in range(n_cols):
+                    name = names[well]
+                    worksheet.cell(first_row + r + 1, first_col + c + 1, None if name == "NONE" else name)
+                    well += 1
+
+        write_ranges(worksheet, layout["concentration_ranges"], np.repeat(concentrations[:, None], layout["n_wells"], axis=1))
+        for block, offset in enumerate(replicate_offsets(layout, n_experiments)):
+            write_ranges(worksheet, layout["replicate_ranges"], responses[block], offset)
+
+    workbook.save(path)
+    return truth
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a synthetic plate workbook.")
+    parser.add_argument("path")
+    parser.add_argument("-n", "--experiments", type=int, default=3)
+    parser.add_argument("-s", "--sheets", type=int, default=1)
+    parser.add_argument("--noise", type=float, default=3.0)
+    parser.add_argument("--compounds", type=int, default=None)
+    parser.add_argument("-l", "--layout", default=DEFAULT_LAYOUT)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    make_workbook(args.path, args.experiments, args.sheets, args.noise, args.compounds, args.layout, args.seed)
@@ -0,0 +1,127 @@
+# Importing Libraries
+from collections import namedtuple
+import numpy as np
+from lib.tools import fit_plate, expand_fit
+from lib.models import get_model, logistic, log_half_max
+from lib.instrument import timer, count
+from lib.workers import get_pool
+
+
+# Percentile confidence intervals, one entry per well (NaN where not bootstrapped)
+BootstrapCI = namedtuple("BootstrapCI", ["ic50_low", "ic50_high", "slope_low", "slope_high", "n_ok"])
+
+
+def resample_responses(x_log, experiments_data, params, n_boot, rng, method="auto"):
+    """
+    Draw bootstrap response curves for a set of wells, vectorized over resamples and wells.
+
+    Parameters:
+    - x_log: (n_conc, n_wells) log10 molar concentrations.
+    - experiments_data: (n_experiments, n_conc, n_wells) responses.
+    - params: (n_wells, 5) fitted curve parameters.
+    - n_boot: Number of resamples per well.
+    - rng: numpy Generator.
+    - method: "replicates" resamples experiments at each concentration, "residuals" adds
+      resampled fit residuals of the well's valid points to the fitted curve; "auto" uses
+      replicates when there are at least two experiments. Masked (NaN) points stay NaN.
+
+    Returns:
+    - (n_conc, n_wells * n_boot) resampled mean responses, well-major.
+    """
+    n_exp, n_conc, n_wells = experiments_data.shape
+    if method == "auto":
+        method = "replicates" if n_exp > 1 else "residuals"
+
+    if method == "replicates":
+        # Pick n_exp experiments with replacement, independently at every concentration
+        picks = rng.integers(0, n_exp, size=(n_wells, n_boot, n_exp, n_conc))
+        data = experiments_data.transpose(2, 0, 1)  # (wells, exp, conc)
+        drawn = np.take_along_axis(data[:, None, :, :], picks, axis=2)
+        with np.errstate(invalid="ignore"):
+            samples = np.nanmean(drawn, axis=2)
+    elif method == "residuals":
+        with np.errstate(invalid="ignore", over="ignore"):
+            ymean = np.nanmean(experiments_data, axis=0).T  # (wells, conc)
+            yfit = logistic(x_log.T, *(params[:, k, None] for k in range(5)))
+        residuals = ymean - yfit
+        # Draw only from the finite residuals of each well: they are moved to the front of the row
+        # and picks stay below their count. Masked or missing points stay NaN in every resample.
+        valid = np.isfinite(residuals)
+        drawable = np.take_along_axis(residuals, np.argsort(~valid, axis=1, kind="stable"), axis=1)
+        picks = (rng.random((n_wells, n_boot, n_conc)) * valid.sum(axis=1)[:, None, None]).astype(int)
+        samples = yfit[:, None, :] + np.take_along_axis(drawable[:, None, :], picks, axis=2)
+        samples[~np.broadcast_to(valid[:, None, :], samples.shape)] = np.nan
+    else:
+        raise ValueError(f"Unknown bootstrap method '{method}'")
+
+    return samples.reshape(n_wells * n_boot, n_conc).T
+
+
+def _bootstrap_chunk(x_log, experiments_data, params, n_boot, seed, method, ci, model):
+    """Bootstrap one chunk of wells fitted with the same model; the unit of work of the worker pool."""
+    rng = np.random.default_rng(seed)
+    n_wells = x_log.shape[1]
+
+    samples = resample_responses(x_log, experiments_data, params, n_boot, rng, method)
+    x_rep = np.repeat(x_log, n_boot, axis=1)
+
+    # Every resample starts from its well's fitted parameters
+    model = get_model(model)
+    fits = expand_fit(fit_plate(x_rep, samples[None], p0=model.free_params(np.repeat(params, n_boot, axis=0)), model=model))
+
+    log_ic50 = np.where(fits.converged, log_half_max(fits.params), np.nan).reshape(n_wells, n_boot)
+    slope = np.where(fits.converged, fits.params[:, 3], np.nan).reshape(n_wells, n_boot)
+    tail = (100 - ci) / 2
+    with np.errstate(invalid="ignore"):
+        ic50_low, ic50_high = 10 ** np.nanpercentile(log_ic50, [tail, 100 - tail], axis=1)
+        slope_low, slope_high = np.nanpercentile(slope, [tail, 100 - tail], axis=1)
+    return ic50_low, ic50_high, slope_low, slope_high, np.isfinite(log_ic50).sum(axis=1)
+
+
+def bootstrap_plate(x_log, experiments_data, fits, wells, n_boot=1000, method="auto", ci=95,
+                    seed=None, max_workers=None, chunk_size=4):
+    """
+    Bootstrap confidence intervals of IC50 and Hill slope for the given wells.
+
+    Wells are split into chunks that are resampled and refitted with the batch fitter on
+    the shared worker pool (lib/workers.py); with max_workers=1 everything runs in the calling process.
+
+    Parameters:
+    - x_log: (n_conc, n_wells) log10 molar concentrations.
+    - experiments_data: (n_experiments, n_conc, n_wells) responses.
+    - fits: BatchFit of the plate, as returned by fit_extracted_plate; every well is refitted with its own model.
+    - wells: Indices of the wells to bootstrap.
+    - n_boot: Number of resamples per well.
+    - method: "auto", "replicates" or "residuals" (see resample_responses).
+    - ci: Confidence level in percent.
+    - seed: Seed for reproducible intervals.
+    - max_workers: 1 to stay in this process; otherwise the shared worker pool is used.
+    - chunk_size: Wells per task.
+
+    Returns:
+    - BootstrapCI with IC50 (molar) and slope bounds for every well of the plate.
+    """
+    experiments_data = np.asarray(experiments_data, dtype=float)
+    n_wells = x_log.shape[1]
+    result = [np.full(n_wells, np.nan) for _ in range(4)] + [np.zeros(n_wells, dtype=int)]
+
+    wells = np.asarray(wells, dtype=int)
+    models = np.asarray(fits.model)[wells]
+    chunks = [group[i:i + chunk_size] for name in dict.fromkeys(models.tolist())
+              for group in [wells[models == name]] for i in range(0, len(group), chunk_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(chunks))
+    tasks = [(x_log[:, chunk], experiments_data[:, :, chunk], fits.params[chunk], n_boot, child, method, ci,
+              fits.model[chunk[0]]) for chunk, child in zip(chunks, seeds)]
+
+    with timer("bootstrap", wells=len(wells), n_boot=n_boot):
+        if max_workers == 1 or len(tasks) <= 1:
+            outputs = [_bootstrap_chunk(*task) for task in tasks]
+        else:
+            outputs = list(get_pool().map(_bootstrap_chunk, *zip(*tasks)))
+    count("bootstrap.fits", len(wells) * n_boot)
+
+    for chunk, output in zip(chunks, outputs):
+        for column, values in zip(result, output):
+            column[chunk] = values
+
+    return BootstrapCI(*result)
@@ -0,0 +1,97 @@
+# Importing Libraries
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+class LRUCache:
+    """
+    Bounded, thread-safe mapping that evicts the least recently used entry.
+
+    Streamlit serves every session from threads of one process, so instances at
+    module level are shared by all reruns and all users.
+    """
+
+    def __init__(self, maxsize=32):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._data
+
+    def get(self, key, default=None):
+        """Return the cached value for `key` and mark it as recently used."""
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        """Store `value`, evicting the oldest entries beyond `maxsize`."""
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def get_or_compute(self, key, compute):
+        """
+        Return the cached value for `key`, calling `compute()` and storing its result on a miss.
+
+        The lock is not held while computing, so two sessions missing the same key at
+        once may both compute it; the last result wins.
+        """
+        sentinel = object()
+        value = self.get(key, sentinel)
+        if value is sentinel:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+def file_hash(uploaded_file):
+    """
+    SHA-256 of the file contents, used as the cache key of an upload.
+
+    Parameters:
+    - uploaded_file: Path, bytes or file-like object (e.g. a Streamlit UploadedFile).
+
+    Returns:
+    - Hex digest string.
+    """
+    if isinstance(uploaded_file, (bytes, bytearray)):
+        data = uploaded_file
+    elif hasattr(uploaded_file, "getvalue"):
+        data = uploaded_file.getvalue()
+    elif hasattr(uploaded_file, "read"):
+        uploaded_file.seek(0)
+        data = uploaded_file.read()
+        uploaded_file.seek(0)
+    else:
+        with open(uploaded_file, "rb") as handle:
+            data = handle.read()
+    return hashlib.sha256(data).hexdigest()
+
+
+# Shared caches for parsed plates, fit results and rendered figures
+SHEET_CACHE  = LRUCache(maxsize=64)
+PLATE_CACHE  = LRUCache(maxsize=32)
+FIT_CACHE    = LRUCache(maxsize=32)
+FIGURE_CACHE = LRUCache(maxsize=512)
+
+# Fit of a single well keyed by a hash of its input (see pipeline.well_fit_keys)
+WELL_FIT_CACHE = LRUCache(maxsize=16384)
@@ -0,0 +1,93 @@
+# Importing Libraries
+import json
+import time
+from urllib.error import HTTPError
+from urllib.parse import urlencode
+from urllib.request import Request, urlopen
+import numpy as np
+
+
+class ServiceError(RuntimeError):
+    """Error response of the fitting service."""
+
+    def __init__(self, status, message):
+        super().__init__(f"{status}: {message}")
+        self.status = status
+
+
+class FitClient:
+    """
+    Minimal client of the fitting service (lib/service.py), for LIMS scripts and notebooks.
+
+    Busy responses (503) are retried after a short pause.
+    """
+
+    def __init__(self, url="http://127.0.0.1:8765", timeout=600, retries=3):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+        self.retries = retries
+
+    def _request(self, path, data=None, content_type="application/json", query=None):
+        url = self.url + path + (f"?{urlencode(query, doseq=True)}" if query else "")
+        for attempt in range(self.retries + 1):
+            request = Request(url, data=data, headers={"Content-Type": content_type} if data is not None else {})
+            try:
+                with urlopen(request, timeout=self.timeout) as response:
+                    return json.loads(response.read())
+            except HTTPError as err:
+                if err.code == 503 and attempt < self.retries:
+                    time.sleep(float(err.headers.get("Retry-After", 1)))
+                    continue
+                raise ServiceError(err.code, json.loads(err.read() or b"{}").get("error", err.reason)) from None
+
+    def health(self):
+        return self._request("/health")
+
+    def models(self):
+        return self._request("/models")
+
+    def fit(self, responses, concentrations=None, log_concentrations=None, names=None, model=None, criterion=None):
+        """
+        Fit response arrays.
+
+        Parameters:
+        - responses: (n_conc, n_wells) or (n_experiments, n_conc, n_wells) responses.
+        - concentrations: Concentrations in uM, (n_conc, n_wells) or (n_conc,).
+        - log_concentrations: Log10 molar concentrations instead of concentrations.
+        - names: Optional name of every well.
+        - model: Model name or "auto"; the service default if None.
+        - criterion: Model selection criterion of "auto".
+
+        Returns:
+        - List of result rows, one per fitted well.
+        """
+        body = {"responses": np.asarray(responses, dtype=float).tolist()}
+        if concentrations is not None:
+            body["concentrations"] = np.asarray(concentrations, dtype=float).tolist()
+        if log_concentrations is not None:
+            body["log_concentrations"] = np.asarray(log_concentrations, dtype=float).tolist()
+        for key, value in (("names", names), ("model", model), ("criterion", criterion)):
+            if value is not None:
+                body[key] = list(value) if key == "names" else value
+        return self._request("/fit", json.dumps(body, allow_nan=True).encode())["records"]
+
+    def fit_workbook(self, workbook, sheets=None, **options):
+        """
+        Fit an Excel workbook.
+
+        Parameters:
+        - workbook: Path or bytes of the .xlsx file.
+        - sheets: Sheet names to fit; all sheets if None.
+        - options: layout, experiments, model, criterion or min_z_prime.
+
+        Returns:
+        - List of {"sheet", "records", "error"} dictionaries.
+        """
+        if not isinstance(workbook, bytes):
+            with open(workbook, "rb") as handle:
+                workbook = handle.read()
+        query = {key: value for key, value in options.items() if value is not None}
+        if sheets:
+            query["sheet"] = list(sheets)
+        return self._request("/workbook", workbook, "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                             query)["sheets"]
@@ -1,53 +1,88 @@
- # Importing Libraries
-import streamlit as st
+# Importing Libraries
 import numpy as np
+import streamlit as st
 import pandas as pd
-from scipy.optimize import curve_fit
-from scipy.interpolate import interp1d
-from matplotlib import cm
-import matplotlib as mpl
-import matplotlib.pylab as plt
-from mpl_toolkits.axes_grid1.inset_locator import inset_axes
-from IPython.display import set_matplotlib_formats
-from decimal import Decimal
-import re
-import os
-from lib.extract import *
-from lib.tools import *
-
-def display_compounds(df):
-    """
-    Reshape, style, and display the compounds dataframe in Streamlit.
+from lib.plate import MOCK, MEK, NONE
+
+
+# Text colour of the control and empty wells
+ROLE_COLORS = {MOCK: 'color: lightblue', MEK: 'color: orange', NONE: 'color: red'}
+
+
+def highlight_values(roles):
+    """Text colour of every well from its role, and the indices of the highlighted wells."""
+    colors_list = [ROLE_COLORS.get(role, 'color: black') for role in roles]
+    indices = [idx for idx, role in enumerate(roles) if role in ROLE_COLORS]
+    return colors_list, indices
+
+
+def well_labels(n_wells):
+    """Column labels of a well-per-column table, numbered from 1 like the result rows."""
+    return [str(i) for i in range(1, n_wells + 1)]
+
+
+def role_styles(roles, n_rows, prop="background-color"):
+    """
+    CSS of every cell of a well-per-column table, built once: control and empty wells are tinted.
+
+    Parameters:
+    - roles: Role code of every well (Plate.roles).
+    - n_rows: Number of table rows.
+    - prop: CSS property the role colours are applied to.
+
+    Returns:
+    - (n_rows, n_wells) array of CSS strings, ready for Styler.apply(..., axis=None).
+    """
+    column_css = np.array([f"{prop}: {ROLE_COLORS[role].split(':')[-1].strip()}" if role in ROLE_COLORS else ""
+                           for role in roles], dtype=object)
+    return np.broadcast_to(column_css, (n_rows, len(roles)))
+
+
+def reshape_dataframe(df, column_size=16):
+    """
+    Reshape a long one-column dataframe into side-by-side columns for better display.
+
+    Parameters:
+    - df: One-column dataframe, one row per well.
+    - column_size: Wells per displayed column; 16 gives two columns for 32 wells and eight for 128.
+
+    Returns:
+    - Dataframe with columns labelled "Compounds 1-16", "Compounds 17-32", ...
+    """
+    chunks = [df.iloc[start:start + column_size].reset_index(drop=True) for start in range(0, len(df), column_size)]
+    reshaped_data = pd.concat(chunks, axis=1)
+    reshaped_data.columns = [f"Compounds {start + 1}-{min(start + column_size, len(df))}"
+                             for start in range(0, len(df), column_size)]
+    return reshaped_data
+
+
+
+def display_compounds(names, roles, column_size=16):
+    """
+    Reshape, style, and display the compound names in Streamlit.
     
     Parameters:
-    - df: The combined compounds dataframe.
+    - names: Compound name of every well (Plate.names).
+    - roles: Role code of every well (Plate.roles).
+    - column_size: Wells per displayed column.
     
     Returns:
     - Tuple of (colored_indices, combined_colors).
     """
-    # Melt the dataframe
-    melted_df = df.melt(value_name="Compounds").drop(columns="variable")
-
-    # Reset index to start from 1
-    melted_df.index = melted_df.index + 1
+    # One row per well, numbered from 1
+    melted_df = pd.DataFrame({"Compounds": names}, index=range(1, len(names) + 1))
 
     # Reshape the dataframe for display
-    reshaped_df = reshape_dataframe(melted_df)
+    reshaped_df = reshape_dataframe(melted_df, column_size)
 
-    # Apply styling and collect indices
-    colors_col1, indices_col1 = highlight_values(reshaped_df["Compounds 1-16"])
-    colors_col2, indices_col2 = highlight_values(reshaped_df["Compounds 17-32"])
-    
-    colored_indices = indices_col1 + [i + 16 for i in indices_col2]
-    combined_colors = colors_col1 + colors_col2
-    print(combined_colors)
+    # Colour the controls and collect their indices; the wells fill the columns top to bottom
+    combined_colors, colored_indices = highlight_values(roles)
+    padded = combined_colors + [""] * (reshaped_df.size - len(names))
+    styles = np.array(padded, dtype=object).reshape(reshaped_df.shape[1], -1).T
 
-    styled_df = reshaped_df.style.apply(lambda x: colors_col1, axis=0, subset=["Compounds 1-16"]) \
-                                .apply(lambda x: colors_col2, axis=0, subset=["Compounds 17-32"])
-    
-    # Display the styled dataframe in Streamlit
+    # One styling pass over the whole table
     st.markdown("## Extracted Compounds")
-    st.markdown(styled_df.to_html(escape=False), unsafe_allow_html=True)
+    st.dataframe(reshaped_df.style.apply(lambda _: styles, axis=None), hide_index=True)
 
     # To check the indices
     return colored_indices, combined_colors
@@ -70,40 +105,147 @@ def display_head_data(assay_text, title_text):
 
 
 
-def display_concentrations(data, colored_indices, combined_colors):
+def display_concentrations(data, roles):
     """
-    Display the extracted data in a table format in Streamlit with colored columns.
+    Display the concentrations, one column per well with the control wells tinted.
     
     Parameters:
-    - data: The numpy array containing the extracted data.
-    - colored_indices: List of column indices to be colored.
-    - combined_colors: List of colors corresponding to each column.
+    - data: (n_conc, n_wells) concentrations in uM.
+    - roles: Role code of every well (Plate.roles).
     
     Returns:
     - None (directly displays the data in Streamlit).
     """
-    df = pd.DataFrame(data)  # Convert the numpy array to a dataframe
-    styler = df.style
+    df = pd.DataFrame(data, columns=well_labels(data.shape[1]))
+    styles = role_styles(roles, len(df))
 
-    for idx, color in zip(colored_indices, combined_colors):
-        styler = style_table(styler, combined_colors[idx], idx)
-    
     st.markdown("## Concentration uM")
-    st.markdown(styler.to_html(escape=False), unsafe_allow_html=True)
+    st.dataframe(df.style.apply(lambda _: styles, axis=None).format("{:.3g}"), hide_index=True)
 
 
 
+def display_experiments(responses, roles):
+    """
+    Display every replicate block in its own tab.
 
-def display_experiment(df, number):
+    Parameters:
+    - responses: (n_replicates, n_conc, n_wells) responses (Plate.responses).
+    - roles: Role code of every well (Plate.roles).
+
+    Returns:
+    - None (directly displays the data in Streamlit).
     """
-    Display the extracted data in a table format in Streamlit.
+    labels = well_labels(responses.shape[2])
+    styles = role_styles(roles, responses.shape[1])
+    config = {label: st.column_config.NumberColumn(label, format="%.1f") for label in labels}
+
+    st.markdown("## Experiments")
+    for number, (tab, block) in enumerate(zip(st.tabs([f"Experiment {i}" for i in range(1, len(responses) + 1)]),
+                                              responses), 1):
+        with tab:
+            st.dataframe(pd.DataFrame(block, columns=labels).style.apply(lambda _: styles, axis=None),
+                         column_config=config, hide_index=True)
+
+
+
+def display_heatmap(mean, vmin=0, vmax=None):
+    """
+    Display the mean response of every point as a heatmap table.
+
+    Parameters:
+    - mean: (n_conc, n_wells) mean responses (Plate.mean).
+    - vmin, vmax: Colour scale limits; vmax defaults to the largest response.
+
+    Returns:
+    - None (directly displays the heatmap in Streamlit).
+    """
+    df = pd.DataFrame(mean, columns=well_labels(mean.shape[1]))
+    vmax = float(np.nanmax(mean)) if vmax is None else vmax
+
+    st.markdown("## Mean response")
+    st.dataframe(df.style.background_gradient(cmap="viridis", axis=None, vmin=vmin, vmax=vmax).format("{:.0f}"),
+                 hide_index=True)
+
+
+
+def display_qc(qc):
+    """
+    Show the plate QC metrics, and why the plate failed if it did.
+
+    Parameters:
+    - qc: PlateQC returned by plate_qc.
+
+    Returns:
+    - None (directly displays the metrics in Streamlit).
+    """
+    st.markdown("## Plate QC")
+    z_col, sb_col, cv_col, out_col = st.columns(4)
+    z_col.metric("Z′-factor", f"{qc.z_prime:.2f}")
+    sb_col.metric("Signal / background", f"{qc.signal_to_background:.1f}")
+    cv_col.metric("Median replicate CV", f"{pd.Series(qc.well_cv).median():.1f} %")
+    out_col.metric("Outlier replicates", int(qc.outliers.sum()))
+    if not qc.passed:
+        st.error("Plate failed QC: " + "; ".join(qc.reasons))
+
+
+
+def display_performance(stats, profile_report=None):
+    """
+    Show the stage timings, counters and optional profiler report of a run in a collapsible panel.
     
     Parameters:
-    - df: The dataframe containing the extracted data.
+    - stats: The RunStats collected during the run.
+    - profile_report: Optional profiler text report.
     
     Returns:
-    - None (directly displays the data in Streamlit).
+    - None (directly displays the panel in Streamlit).
+    """
+    with st.expander("Performance", expanded=False):
+        summary = stats.summary()
+        if summary:
+            table = pd.DataFrame.from_dict(summary, orient="index")
+            table.index.name = "stage"
+            st.dataframe(table, column_config={
+                "total_s": st.column_config.NumberColumn("total (s)", format="%.3f"),
+                "max_s": st.column_config.NumberColumn("max (s)", format="%.3f"),
+            })
+        if stats.counters:
+            st.dataframe(pd.Series(stats.counters, name="count").to_frame())
+        if profile_report:
+            st.code(profile_report)
+
+
+def display_job(job, sheets):
     """
-    st.markdown("## Experiment "+str(number))
-    st.table(df)
+    Show the progress and the results saved so far of a background job.
 
+    Parameters:
+    - job: Dictionary returned by get_job.
+    - sheets: List returned by job_sheets.
+
+    Returns:
+    - None (directly displays the job in Streamlit).
+    """
+    total = len(job["sheets"])
+    st.markdown(f"## Job `{job['id']}`")
+    st.caption(f"{job['file']} · {job['status']}")
+    st.progress(job["sheets_done"] / total if total else 1.0, text=f"{job['sheets_done']}/{total} sheets")
+    if job["error"]:
+        st.error(f"The job failed: {job['error']}")
+
+    records = []
+    for sheet in sheets:
+        with st.expander(sheet["sheet"], expanded=len(sheets) == 1):
+            if sheet["error"]:
+                st.error(f"Could not process sheet {sheet['sheet']}: {sheet['error']}")
+            elif not sheet["records"]:
+                st.info("No compounds to fit on this sheet.")
+                st.caption(f"{sheet['seconds']:.1f} s")
+            else:
+                st.dataframe(pd.DataFrame(sheet["records"]).drop(columns=["file", "sheet"]), hide_index=True)
+                st.caption(f"{sheet['seconds']:.1f} s")
+        records.extend(sheet["records"])
+
+    if records:
+        st.download_button("Download results CSV", pd.DataFrame(records).to_csv(index=False),
+                           file_name=f"ic50_{job['id']}.csv", mime="text/csv", key=f"job_csv_{job['id']}")
@@ -0,0 +1,93 @@
+# Importing Libraries
+import re
+import zipfile
+from lib.instrument import timer, count
+
+
+def safe_name(text):
+    """Make a compound or sheet name usable as a file name."""
+    return re.sub(r'[^\w.-]+', '_', str(text)).strip('_') or "unnamed"
+
+
+def compound_jobs(plate, fits, mask=None):
+    """
+    plot_compound arguments of every fitted well, in plate order.
+
+    Parameters:
+    - plate: The Plate.
+    - fits: BatchFit for the plate.
+    - mask: Optional (n_conc, n_wells) boolean array of the points used in the fit.
+
+    Returns:
+    - Dictionary mapping a file stem ("02_CPD-1") to the plot_compound arguments.
+    """
+    from lib.plot import mock_curves
+
+    mocks = mock_curves(plate)
+    jobs = {}
+    for i in plate.fitted_wells.tolist():
+        excluded = None if mask is None else ~mask[:, i]
+        jobs[f"{i + 1:02d}_{safe_name(plate.names[i])}"] = (plate.x_log[:, i], plate.mean[:, i], plate.std[:, i],
+                                                            fits.params[i], plate.names[i], plate.y_label, mocks, excluded)
+    return jobs
+
+
+def write_report_pdf(jobs, output):
+    """
+    Write every figure as one page of a single PDF.
+
+    Pages are drawn and written one at a time, so only one figure is ever in memory.
+
+    Parameters:
+    - jobs: Dictionary of plot_compound arguments, as returned by compound_jobs.
+    - output: Path or binary file-like object.
+    """
+    from matplotlib.backends.backend_pdf import PdfPages
+    from lib.plot import plot_compound
+
+    with timer("export.pdf", pages=len(jobs)), PdfPages(output) as pdf:
+        for job in jobs.values():
+            pdf.savefig(plot_compound(*job), bbox_inches='tight')
+    count("export.pdf_pages", len(jobs))
+
+
+def write_figures_zip(jobs, output, fmt="png", dpi=None, parallel=True):
+    """
+    Write every figure as its own file in a ZIP archive.
+
+    Figures are rendered on the shared render pool a bounded window at a time and added to
+    the archive as soon as each one finishes, so only the figures in flight are held in memory.
+
+    Parameters:
+    - jobs: Dictionary of plot_compound arguments, as returned by compound_jobs.
+    - output: Path or binary file-like object.
+    - fmt: Image format, e.g. "png" or "svg".
+    - dpi: Resolution of raster formats; screen resolution (PREVIEW_DPI) by default, as 600-dpi
+      PNGs of a whole plate are slow to render and tens of MB large.
+    - parallel: False renders in the calling process, e.g. inside a batch worker.
+    """
+    from lib.plot import render_compound, render_compounds, PREVIEW_DPI
+
+    dpi = dpi or PREVIEW_DPI
+    if parallel:
+        images = render_compounds(jobs, fmt, dpi)
+    else:
+        images = ((key, render_compound(job, fmt, dpi)) for key, job in jobs.items())
+
+    # PNG is already compressed; text formats such as SVG shrink a lot
+    compression = zipfile.ZIP_STORED if fmt == "png" else zipfile.ZIP_DEFLATED
+    with timer("export.zip", fmt=fmt, figures=len(jobs)), zipfile.ZipFile(output, "w", compression) as archive:
+        for key, image in images:
+            archive.writestr(f"{key}.{fmt}", image)
+    count(f"export.{fmt}_figures", len(jobs))
+
+
+def write_table(records, output):
+    """Write result rows as CSV or, for a .parquet output, Parquet."""
+    import pandas as pd
+
+    table = pd.DataFrame(records)
+    if str(output).endswith(".parquet"):
+        table.to_parquet(output, index=False)
+    else:
+        table.to_csv(output, index=False)
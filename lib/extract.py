@@ -1,153 +1,302 @@
- # Importing Libraries
-import streamlit as st
+# Importing Libraries
 import numpy as np
-import pandas as pd
-from scipy.optimize import curve_fit
-from scipy.interpolate import interp1d
-from matplotlib import cm
-import matplotlib as mpl
-import matplotlib.pylab as plt
-from mpl_toolkits.axes_grid1.inset_locator import inset_axes
-from IPython.display import set_matplotlib_formats
-from decimal import Decimal
-import re
-import os
-from lib.display import *
-from lib.tools import *
-
-def extract_compounds(uploaded_file, selected_sheet):
+from openpyxl import load_workbook
+from lib.layout import load_layout, layout_bounds, replicate_offsets
+from lib.instrument import timed
+
+
+def list_sheets(uploaded_file):
     """
-    Extract compounds from the specified Excel file and sheet.
+    List the sheet names of a workbook without parsing any sheet.
     
     Parameters:
-    - uploaded_file: The uploaded Excel file.
+    - uploaded_file: The uploaded Excel file (path or file-like object).
+    
+    Returns:
+    - List of sheet names.
+    """
+    if hasattr(uploaded_file, "seek"):
+        uploaded_file.seek(0)
+
+    workbook = load_workbook(uploaded_file, read_only=True)
+    try:
+        return list(workbook.sheetnames)
+    finally:
+        workbook.close()
+
+
+def worksheet_grid(worksheet, max_row=None, max_col=None):
+    """
+    Parse an open read-only worksheet into a 2D object array holding the cell values.
+    
+    Parameters:
+    - worksheet: An openpyxl worksheet.
+    - max_row, max_col: Optional 1-based bounds; cells beyond them are never parsed.
+    
+    Returns:
+    - A 2D numpy object array, padded with None where the sheet has no cells.
+    """
+    rows = [tuple(row) for row in worksheet.iter_rows(max_row=max_row, max_col=max_col, values_only=True)]
+
+    n_cols = max((len(row) for row in rows), default=0)
+    grid = np.full((len(rows), n_cols), None, dtype=object)
+    for idx, row in enumerate(rows):
+        grid[idx, :len(row)] = row
+
+    return grid
+
+
+def read_sheet_grid(uploaded_file, selected_sheet, max_row=None, max_col=None):
+    """
+    Parse a worksheet once into a 2D object array holding the cell values.
+    
+    Parameters:
+    - uploaded_file: The uploaded Excel file (path or file-like object).
     - selected_sheet: The sheet name to extract data from.
+    - max_row, max_col: Optional 1-based bounds; cells beyond them are never parsed.
     
     Returns:
-    - A flattened numpy array of the compounds.
+    - A 2D numpy object array, padded with None where the sheet has no cells.
+    """
+    if hasattr(uploaded_file, "seek"):
+        uploaded_file.seek(0)
+
+    # Read-only, values-only mode streams the sheet XML without building cell objects
+    workbook = load_workbook(uploaded_file, read_only=True, data_only=True)
+    try:
+        return worksheet_grid(workbook[selected_sheet], max_row, max_col)
+    finally:
+        workbook.close()
+
+
+def iter_sheet_readers(uploaded_file, layout=None):
     """
-    # Read specific range for compounds from the selected sheet
-    compounds_D = pd.read_excel(uploaded_file, usecols="D", skiprows=5, nrows=16, header=None, sheet_name=selected_sheet).fillna("NONE")
-    compounds_O = pd.read_excel(uploaded_file, usecols="O", skiprows=5, nrows=16, header=None, sheet_name=selected_sheet).fillna("NONE")
+    Open a workbook once and lazily yield a PlateReader for each sheet in order.
 
-    # Combine the dataframes
-    combined_compounds = pd.concat([compounds_D, compounds_O], axis=1)
+    Only the current sheet's grid is in memory; it is released once the caller moves on.
     
-    # Convert the combined dataframe to a numpy array and flatten
-    compounds_np_array = combined_compounds.to_numpy()
-    flattened_array = np.concatenate([compounds_np_array[:, 0], compounds_np_array[:, 1]])
+    Parameters:
+    - uploaded_file: The uploaded Excel file (path or file-like object).
+    - layout: Plate layout name, path or dictionary.
     
-    return combined_compounds, flattened_array
+    Returns:
+    - Generator of PlateReader objects.
+    """
+    layout = load_layout() if layout is None else load_layout(layout)
+    if hasattr(uploaded_file, "seek"):
+        uploaded_file.seek(0)
+
+    workbook = load_workbook(uploaded_file, read_only=True, data_only=True)
+    try:
+        for worksheet in workbook.worksheets:
+            yield PlateReader.from_grid(worksheet.title, worksheet_grid(worksheet, *layout_bounds(layout)), layout)
+    finally:
+        workbook.close()
 
 
-def extract_head_data(uploaded_file, selected_sheet):
+def _to_float(values):
+    """Convert an object array to float64, turning empty or non-numeric cells into NaN."""
+    out = np.full(values.shape, np.nan)
+    for idx, val in np.ndenumerate(values):
+        if isinstance(val, (int, float)) and not isinstance(val, bool):
+            out[idx] = val
+    return out
+
+
+class PlateReader:
     """
-    Extract assay and title texts from the specified Excel file and sheet.
+    Single-pass reader for one sheet of a plate workbook.
+
+    Only the area covered by the plate layout is parsed, once, on construction; the head
+    text, compounds, concentrations, Y label and experiment blocks are then served as
+    slices of the in-memory grid.
+    """
+
+    def __init__(self, uploaded_file, selected_sheet, layout=None):
+        self.sheet  = selected_sheet
+        self.layout = load_layout() if layout is None else load_layout(layout)
+        self.grid   = read_sheet_grid(uploaded_file, selected_sheet, *layout_bounds(self.layout))
+
+    @classmethod
+    def from_grid(cls, selected_sheet, grid, layout):
+        """Build a reader around an already parsed grid."""
+        reader = cls.__new__(cls)
+        reader.sheet  = selected_sheet
+        reader.layout = load_layout(layout)
+        reader.grid   = grid
+        return reader
+
+    def cell(self, row, col):
+        """Return the value at a 0-based (row, col), or None outside the parsed area."""
+        if row < self.grid.shape[0] and col < self.grid.shape[1]:
+            return self.grid[row, col]
+        return None
+
+    def values(self, first_row, n_rows, first_col, n_cols):
+        """Return a (n_rows, n_cols) object slice, padded with None outside the parsed area."""
+        out = np.full((n_rows, n_cols), None, dtype=object)
+        part = self.grid[first_row:first_row + n_rows, first_col:first_col + n_cols]
+        out[:part.shape[0], :part.shape[1]] = part
+        return out
+
+    def plate_block(self, ranges, row_offset=0, out=None):
+        """
+        Return layout ranges as one (concentrations, wells) float array.
+
+        Each range has wells along its rows; the ranges are joined well-wise in order.
+        With `out`, the ranges are written straight into that array instead.
+        """
+        if out is None:
+            out = np.empty((ranges[0][3], sum(n_rows for _, _, n_rows, _ in ranges)))
+        well = 0
+        for first_row, first_col, n_rows, n_cols in ranges:
+            out[:, well:well + n_rows] = _to_float(self.values(first_row + row_offset, n_rows, first_col, n_cols)).T
+            well += n_rows
+        return out
+
+    def block_has_data(self, row_offset):
+        """True if the replicate block at `row_offset` holds any number."""
+        return bool(np.isfinite(self.plate_block(self.layout["replicate_ranges"], row_offset)).any())
+
+
+def get_reader(uploaded_file, selected_sheet=None, layout=None):
+    """Return a PlateReader for the sheet, reusing `uploaded_file` if it already is one."""
+    if isinstance(uploaded_file, PlateReader):
+        return uploaded_file
+    return PlateReader(uploaded_file, selected_sheet, layout)
+
+
+@timed("extract.count_experiments")
+def count_experiments(uploaded_file, selected_sheet=None, layout=None):
+    """
+    Count the consecutive replicate blocks that hold data.
     
     Parameters:
-    - uploaded_file: The uploaded Excel file.
+    - uploaded_file: The uploaded Excel file, or a PlateReader for the sheet.
     - selected_sheet: The sheet name to extract data from.
+    - layout: Plate layout name, path or dictionary.
     
     Returns:
-    - Tuple of (assay_text, title_text).
+    - Number of experiments found (0 if the first block is empty).
+    """
+    reader = get_reader(uploaded_file, selected_sheet, layout)
+
+    n_blocks = 0
+    for offset in replicate_offsets(reader.layout):
+        if not reader.block_has_data(offset):
+            break
+        n_blocks += 1
+    return n_blocks
+
+
+@timed("extract.compounds")
+def extract_compound_names(uploaded_file, selected_sheet=None, layout=None):
+    """
+    Compound name of every well, in layout order; empty cells read as "NONE".
+
+    Parameters:
+    - uploaded_file: The uploaded Excel file, or a PlateReader for the sheet.
+    - selected_sheet: The sheet name to extract data from.
+    - layout: Plate layout name, path or dictionary.
+
+    Returns:
+    - (n_wells,) numpy object array.
+    """
+    reader = get_reader(uploaded_file, selected_sheet, layout)
+    names = np.concatenate([reader.values(first_row, n_rows, first_col, n_cols).ravel()
+                            for first_row, first_col, n_rows, n_cols in reader.layout["compound_ranges"]])
+    names[np.equal(names, None)] = "NONE"
+    return names
+
+
+def extract_compounds(uploaded_file, selected_sheet=None, layout=None):
     """
-    assay = pd.read_excel(uploaded_file, usecols="A", skiprows=0, nrows=1, header=None, sheet_name=selected_sheet).fillna("NONE")
-    title = pd.read_excel(uploaded_file, usecols="A", skiprows=1, nrows=1, header=None, sheet_name=selected_sheet).fillna("NONE")
+    Extract compounds from the specified Excel file and sheet.
     
-    assay_text = assay.iloc[0, 0]
-    title_text = title.iloc[0, 0]
+    Parameters:
+    - uploaded_file: The uploaded Excel file, or a PlateReader for the sheet.
+    - selected_sheet: The sheet name to extract data from.
+    - layout: Plate layout name, path or dictionary.
     
-    return assay_text, title_text
+    Returns:
+    - Tuple of (compounds dataframe with one column per layout range, flattened numpy array of the compounds).
+    """
+    import pandas as pd
+
+    reader = get_reader(uploaded_file, selected_sheet, layout)
+
+    # One column per compound range of the layout (columns D and O, rows 6 to 21 by default)
+    flattened_array = extract_compound_names(reader)
+    sizes = [n_rows * n_cols for _, _, n_rows, n_cols in reader.layout["compound_ranges"]]
+    columns = np.split(flattened_array, np.cumsum(sizes)[:-1])
+    combined_compounds = pd.DataFrame(dict(zip(reader.layout["compounds"], columns)))
+
+    return combined_compounds, flattened_array
 
 
-def extract_concentrations(uploaded_file, selected_sheet):
+@timed("extract.head_data")
+def extract_head_data(uploaded_file, selected_sheet=None, layout=None):
     """
-    Extract data from columns C through M and N through X, for rows 25 to 40, from the specified Excel file and sheet.
+    Extract assay and title texts from the specified Excel file and sheet.
     
     Parameters:
-    - uploaded_file: The uploaded Excel file.
+    - uploaded_file: The uploaded Excel file, or a PlateReader for the sheet.
     - selected_sheet: The sheet name to extract data from.
+    - layout: Plate layout name, path or dictionary.
     
     Returns:
-    - A numpy array containing the extracted data.
+    - Tuple of (assay_text, title_text).
     """
-    # Define the columns to extract
-    columns_CM = [chr(i) for i in range(ord('C'), ord('M')+1)]
-    columns_NX = [chr(i) for i in range(ord('N'), ord('X')+1)]
+    reader = get_reader(uploaded_file, selected_sheet, layout)
 
-    # Extract data for CM columns
-    data_list_CM = []
-    for col in columns_CM:
-        try:
-            data = pd.read_excel(uploaded_file, usecols=col, skiprows=24, nrows=16, header=None, sheet_name=selected_sheet)
-            data_list_CM.append(data.squeeze())  # Use squeeze to convert single columns to Series
-        except ValueError:
-            continue
-    combined_data_CM = pd.concat(data_list_CM, axis=1)
+    assay_text = reader.cell(*reader.layout["assay_cell"])
+    title_text = reader.cell(*reader.layout["title_cell"])
     
-    # Extract data for NX columns
-    data_list_NX = []
-    for col in columns_NX:
-        try:
-            data = pd.read_excel(uploaded_file, usecols=col, skiprows=24, nrows=16, header=None, sheet_name=selected_sheet)
-            data_list_NX.append(data.squeeze())  # Use squeeze to convert single columns to Series
-        except ValueError:
-            continue
-    combined_data_NX = pd.concat(data_list_NX, axis=1)
+    return ("NONE" if assay_text is None else assay_text), ("NONE" if title_text is None else title_text)
+
 
-    # Combine the data
-    all_combined = np.c_[combined_data_CM.T.to_numpy(), combined_data_NX.T.to_numpy()]
+@timed("extract.concentrations")
+def extract_concentrations(uploaded_file, selected_sheet=None, layout=None):
+    """
+    Extract the concentration ranges of the layout (columns C through M and N through X, rows 25 to 40 by default).
+    
+    Parameters:
+    - uploaded_file: The uploaded Excel file, or a PlateReader for the sheet.
+    - selected_sheet: The sheet name to extract data from.
+    - layout: Plate layout name, path or dictionary.
     
-    return all_combined
+    Returns:
+    - A (concentrations, wells) numpy array.
+    """
+    reader = get_reader(uploaded_file, selected_sheet, layout)
+    return reader.plate_block(reader.layout["concentration_ranges"])
 
 
-def extract_experiment(uploaded_file, selected_sheet, start_row):
+def extract_experiment(uploaded_file, selected_sheet=None, start_row=None, layout=None):
     """
-    Extract data from columns C through M and N through X, for rows 25 to 40, from the specified Excel file and sheet.
+    Extract one replicate block laid out like the layout's first block, starting after `start_row` rows.
     
     Parameters:
-    - uploaded_file: The uploaded Excel file.
+    - uploaded_file: The uploaded Excel file, or a PlateReader for the sheet.
     - selected_sheet: The sheet name to extract data from.
+    - start_row: Number of rows to skip before the experiment block; defaults to the first block.
+    - layout: Plate layout name, path or dictionary.
     
     Returns:
-    - A numpy array containing the extracted data.
-    """
-    # Define the columns to extract
-    columns_CM = [chr(i) for i in range(ord('C'), ord('M')+1)]
-    columns_NX = [chr(i) for i in range(ord('N'), ord('X')+1)]
-
-    # Extract data for CM columns
-    data_list_CM = []
-    for col in columns_CM:
-        try:
-            data = pd.read_excel(uploaded_file, usecols=col, skiprows=start_row, nrows=16, header=None, sheet_name=selected_sheet)
-            data_list_CM.append(data.squeeze())  # Use squeeze to convert single columns to Series
-        except ValueError:
-            continue
-    combined_data_CM = pd.concat(data_list_CM, axis=1)
-    
-    # Extract data for NX columns
-    data_list_NX = []
-    for col in columns_NX:
-        try:
-            data = pd.read_excel(uploaded_file, usecols=col, skiprows=start_row, nrows=16, header=None, sheet_name=selected_sheet)
-            data_list_NX.append(data.squeeze())  # Use squeeze to convert single columns to Series
-        except ValueError:
-            continue
-    combined_data_NX = pd.concat(data_list_NX, axis=1)
-
-    # Combine the data
-    all_combined = np.c_[combined_data_CM.T.to_numpy(), combined_data_NX.T.to_numpy()]
-    
-    return all_combined
+    - A (concentrations, wells) numpy array.
+    """
+    reader = get_reader(uploaded_file, selected_sheet, layout)
+    ranges = reader.layout["replicate_ranges"]
+    row_offset = 0 if start_row is None else start_row - min(r[0] for r in ranges)
+    return reader.plate_block(ranges, row_offset)
 
 
 # Get y-label:
-def extract_ylabel(uploaded_file, selected_sheet):
-    # Read the Excel file into a DataFrame
-    df = pd.read_excel(uploaded_file, sheet_name=selected_sheet,  header=None)
+@timed("extract.ylabel")
+def extract_ylabel(uploaded_file, selected_sheet=None, layout=None):
+    reader = get_reader(uploaded_file, selected_sheet, layout)
     
-    # Extract the value from cell C42
-    y_label = df.at[41, 2] # because pandas uses 0-based indexing
+    # Extract the value from the Y label cell (C42 by default)
+    y_label = reader.cell(*reader.layout["y_label_cell"])
     
     return y_label
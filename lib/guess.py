@@ -0,0 +1,160 @@
+# Importing Libraries
+import numpy as np
+
+
+# Coarse grid of Hill slopes tried for every well; both signs so activators are covered too
+SLOPE_GRID = np.array([-4.0, -2.5, -1.5, -1.0, -0.7, -0.4, 0.4, 0.7, 1.0, 1.5, 2.5, 4.0])
+LOGIC50_STEPS = 25
+
+
+def monotone_smooth(xdata, ydata, mask):
+    """
+    Monotone smoothing of every well's response along increasing concentration.
+
+    The curve is the mean of the running upper and lower envelopes in the direction of the
+    overall trend, which is monotone, stays within the data range and needs no iteration.
+
+    Parameters:
+    - xdata: (n_wells, n_conc) log10 concentrations.
+    - ydata: (n_wells, n_conc) responses.
+    - mask: (n_wells, n_conc) boolean array of points to use.
+
+    Returns:
+    - Tuple of (sorted x, smoothed y, sorted mask), each (n_wells, n_conc); masked points are NaN.
+    """
+    order = np.argsort(np.where(mask, xdata, np.inf), axis=1)
+    xs = np.take_along_axis(xdata, order, axis=1)
+    ms = np.take_along_axis(mask, order, axis=1)
+    ys = np.where(ms, np.take_along_axis(ydata, order, axis=1), np.nan)
+
+    # Trend: compare the mean of the lower and upper halves of the concentration range
+    half = ms.cumsum(axis=1) <= ms.sum(axis=1, keepdims=True) / 2
+    with np.errstate(divide="ignore", invalid="ignore"):
+        low_mean = np.sum(np.where(half & ms, ys, 0), axis=1) / np.sum(half & ms, axis=1)
+        high_mean = np.sum(np.where(~half & ms, ys, 0), axis=1) / np.sum(~half & ms, axis=1)
+    decreasing = ~(high_mean > low_mean)
+
+    # Flip decreasing wells so every well is smoothed as increasing
+    signed = np.where(decreasing[:, None], -ys, ys)
+    upper = np.fmax.accumulate(signed, axis=1)
+    lower = np.fmin.accumulate(signed[:, ::-1], axis=1)[:, ::-1]
+    smooth = (upper + lower) / 2
+    smooth = np.where(decreasing[:, None], -smooth, smooth)
+
+    return xs, np.where(ms, smooth, np.nan), ms
+
+
+def _linear_bottom_top(f, ydata, mask):
+    """
+    Least-squares Bottom and Top for fixed curve shapes f = 1 / (1 + 10**((c - x) * d)).
+
+    The model is Bottom * (1 - f) + Top * f, linear in (Bottom, Top). Arrays broadcast over
+    any leading dimensions with points on the last axis.
+
+    Returns:
+    - Tuple of (bottom, top, ssr).
+    """
+    w = mask.astype(float)
+    g = 1 - f
+    s_gg = np.sum(w * g * g, axis=-1)
+    s_gf = np.sum(w * g * f, axis=-1)
+    s_ff = np.sum(w * f * f, axis=-1)
+    s_gy = np.sum(w * g * ydata, axis=-1)
+    s_fy = np.sum(w * f * ydata, axis=-1)
+
+    det = s_gg * s_ff - s_gf ** 2
+    with np.errstate(divide="ignore", invalid="ignore"):
+        bottom = (s_ff * s_gy - s_gf * s_fy) / det
+        top = (s_gg * s_fy - s_gf * s_gy) / det
+        ssr = np.sum(w * (ydata - bottom[..., None] * g - top[..., None] * f) ** 2, axis=-1)
+
+    # Curves that do not change inside the data range cannot separate Bottom and Top
+    ssr = np.where(np.abs(det) > 1e-12, ssr, np.inf)
+    return bottom, top, ssr
+
+
+def _shape(x, log_ic50, slope):
+    z = np.clip((log_ic50 - x) * slope, -300, 300)
+    return 1 / (1 + np.power(10, z))
+
+
+def initial_guess(xdata, ydata, mask=None):
+    """
+    Well-conditioned starting (Bottom, Top, LogIC50, Slope) for every well at once.
+
+    LogIC50 and Slope come from a grid search with Bottom and Top solved exactly at every
+    grid point, refined by a linearized Hill fit of the monotone-smoothed response;
+    whichever fits the data better is kept.
+
+    Parameters:
+    - xdata: (n_wells, n_conc) log10 concentrations.
+    - ydata: (n_wells, n_conc) responses.
+    - mask: Optional (n_wells, n_conc) boolean array of points to use.
+
+    Returns:
+    - (n_wells, 4) array of starting parameters.
+    """
+    xdata = np.asarray(xdata, dtype=float)
+    ydata = np.asarray(ydata, dtype=float)
+    mask = np.isfinite(xdata) & np.isfinite(ydata) if mask is None else np.asarray(mask, dtype=bool)
+    xdata = np.where(mask, xdata, 0.0)
+    ydata = np.where(mask, ydata, 0.0)
+    n_wells = xdata.shape[0]
+
+    x_lo = np.where(mask, xdata, np.inf).min(axis=1)
+    x_hi = np.where(mask, xdata, -np.inf).max(axis=1)
+    empty = ~mask.any(axis=1)
+    x_lo[empty], x_hi[empty] = -9.0, -3.0
+
+    # Grid search: (wells, logIC50 steps, slopes, points)
+    steps = np.linspace(0, 1, LOGIC50_STEPS)
+    grid_c = x_lo[:, None] + (x_hi - x_lo)[:, None] * steps[None, :]
+    f = _shape(xdata[:, None, None, :], grid_c[:, :, None, None], SLOPE_GRID[None, None, :, None])
+    bottom, top, ssr = _linear_bottom_top(f, ydata[:, None, None, :], mask[:, None, None, :])
+
+    flat_ssr = ssr.reshape(n_wells, -1)
+    best = np.argmin(np.where(np.isfinite(flat_ssr), flat_ssr, np.inf), axis=1)
+    best_c, best_d = np.unravel_index(best, ssr.shape[1:])
+    rows = np.arange(n_wells)
+    guess = np.column_stack([bottom[rows, best_c, best_d], top[rows, best_c, best_d],
+                             grid_c[rows, best_c], SLOPE_GRID[best_d]])
+    guess_ssr = ssr[rows, best_c, best_d]
+
+    # Linearized Hill fit: log10((Top - y) / (y - Bottom)) = (LogIC50 - x) * Slope
+    xs, smooth, ms = monotone_smooth(xdata, ydata, mask)
+    lo = np.fmin.reduce(smooth, axis=1)
+    hi = np.fmax.reduce(smooth, axis=1)
+    span = hi - lo
+    with np.errstate(divide="ignore", invalid="ignore"):
+        frac = (smooth - lo[:, None]) / span[:, None]
+        inside = ms & (frac > 0.1) & (frac < 0.9)
+        logit = np.log10((1 - frac) / frac)
+        w = inside.astype(float)
+        n = w.sum(axis=1)
+        mx = np.sum(w * xs, axis=1) / n
+        ml = np.sum(w * np.where(inside, logit, 0), axis=1) / n
+        sxx = np.sum(w * (xs - mx[:, None]) ** 2, axis=1)
+        sxl = np.sum(w * (xs - mx[:, None]) * (np.where(inside, logit, 0) - ml[:, None]), axis=1)
+        lin_d = -sxl / sxx
+        lin_c = mx + ml / lin_d
+
+    usable = (n >= 2) & np.isfinite(lin_c) & np.isfinite(lin_d) & (np.abs(lin_d) > 0.05) & (np.abs(lin_d) < 10)
+    lin_c = np.clip(np.where(usable, lin_c, 0.0), x_lo - 1, x_hi + 1)
+    lin_d = np.where(usable, lin_d, -1.0)
+    lin_bottom, lin_top, lin_ssr = _linear_bottom_top(_shape(xdata, lin_c[:, None], lin_d[:, None]), ydata, mask)
+    better = usable & np.isfinite(lin_ssr) & (lin_ssr < guess_ssr)
+    guess[better] = np.column_stack([lin_bottom, lin_top, lin_c, lin_d])[better]
+
+    # Wells where nothing could be estimated fall back to the data range
+    fallback = ~np.all(np.isfinite(guess), axis=1)
+    if fallback.any():
+        y_lo = np.where(mask, ydata, np.inf).min(axis=1)
+        y_hi = np.where(mask, ydata, -np.inf).max(axis=1)
+        y_lo[empty], y_hi[empty] = 0.0, 0.0
+        guess[fallback] = np.column_stack([y_lo, y_hi, (x_lo + x_hi) / 2, -np.ones(n_wells)])[fallback]
+
+    # Same curve with Bottom and Top swapped and the slope negated; keep Bottom <= Top
+    swap = guess[:, 0] > guess[:, 1]
+    guess[swap] = guess[swap][:, [1, 0, 2, 3]] * [1, 1, 1, -1]
+
+    return guess
@@ -0,0 +1,169 @@
+# Importing Libraries
+import contextvars
+import functools
+import io
+import json
+import logging
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+
+logger = logging.getLogger("ic50")
+
+
+class JsonFormatter(logging.Formatter):
+    """Format log records as one JSON object per line, merging in the record's `fields`."""
+
+    def format(self, record):
+        payload = {
+            "time": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "event": record.getMessage(),
+        }
+        payload.update(getattr(record, "fields", {}))
+        if record.exc_info:
+            payload["exception"] = self.formatException(record.exc_info)
+        return json.dumps(payload, default=str)
+
+
+def configure_logging(level=logging.INFO):
+    """
+    Send the "ic50" logger to stderr as JSON lines; calling it again only changes the level.
+
+    Parameters:
+    - level: Logging level, e.g. logging.DEBUG to log every timing.
+    """
+    logger.setLevel(level)
+    if not any(isinstance(handler.formatter, JsonFormatter) for handler in logger.handlers):
+        handler = logging.StreamHandler()
+        handler.setFormatter(JsonFormatter())
+        logger.addHandler(handler)
+        logger.propagate = False
+
+
+def log_event(event, level=logging.INFO, **fields):
+    """Log a structured event with arbitrary JSON-serialisable fields."""
+    logger.log(level, event, extra={"fields": fields})
+
+
+class RunStats:
+    """Stage timings and counters collected during one analysis run."""
+
+    def __init__(self):
+        self.timings = []
+        self.counters = Counter()
+
+    def add_timing(self, stage, seconds, **fields):
+        self.timings.append({"stage": stage, "seconds": seconds, **fields})
+
+    def count(self, name, n=1):
+        self.counters[name] += n
+
+    def summary(self):
+        """
+        Aggregate the timings per stage.
+
+        Returns:
+        - Dictionary mapping each stage to its calls, total and max seconds, in first-seen order.
+        """
+        stages = defaultdict(lambda: {"calls": 0, "total_s": 0.0, "max_s": 0.0})
+        for timing in self.timings:
+            stage = stages[timing["stage"]]
+            stage["calls"] += 1
+            stage["total_s"] += timing["seconds"]
+            stage["max_s"] = max(stage["max_s"], timing["seconds"])
+        return dict(stages)
+
+
+# RunStats of the analysis running in the current thread or task, if any
+_current = contextvars.ContextVar("ic50_run_stats", default=None)
+
+
+@contextmanager
+def collect():
+    """Collect the timings and counters recorded inside the block into a new RunStats."""
+    stats = RunStats()
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+
+def record_timing(stage, seconds, **fields):
+    """Add a timing to the active RunStats and log it at DEBUG level."""
+    stats = _current.get()
+    if stats is not None:
+        stats.add_timing(stage, seconds, **fields)
+    if logger.isEnabledFor(logging.DEBUG):
+        log_event("timing", logging.DEBUG, stage=stage, seconds=round(seconds, 6), **fields)
+
+
+def count(name, n=1):
+    """Increase a counter of the active RunStats."""
+    stats = _current.get()
+    if stats is not None:
+        stats.count(name, n)
+
+
+@contextmanager
+def timer(stage, **fields):
+    """Time the enclosed block as `stage`."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_timing(stage, time.perf_counter() - start, **fields)
+
+
+def timed(stage):
+    """Decorator timing every call of the function as `stage`."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with timer(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def profiled(enabled=True):
+    """
+    Profile the enclosed block with pyinstrument if installed, otherwise cProfile.
+
+    Yields a dictionary whose "report" entry holds the text report once the block exits.
+    """
+    result = {"report": None}
+    if not enabled:
+        yield result
+        return
+
+    try:
+        from pyinstrument import Profiler
+    except ImportError:
+        Profiler = None
+
+    if Profiler is not None:
+        profiler = Profiler()
+        profiler.start()
+        try:
+            yield result
+        finally:
+            profiler.stop()
+            result["report"] = profiler.output_text()
+    else:
+        import cProfile
+        import pstats
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield result
+        finally:
+            profiler.disable()
+            stream = io.StringIO()
+            pstats.Stats(profiler, stream=stream).sort_stats("cumulative").print_stats(40)
+            result["report"] = stream.getvalue()
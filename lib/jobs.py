@@ -0,0 +1,281 @@
+# Importing Libraries
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from lib.instrument import collect, log_event
+from lib.workers import process_pool
+
+
+# Uploaded workbooks and the job database live here; jobs can be reopened by ID until it is cleaned up
+JOBS_DIR = os.environ.get("IC50_JOBS", "ic50_jobs")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id           TEXT PRIMARY KEY,
+    created_at   REAL NOT NULL,
+    updated_at   REAL NOT NULL,
+    status       TEXT NOT NULL,
+    file         TEXT,
+    source_hash  TEXT,
+    settings     TEXT NOT NULL,
+    sheets       TEXT NOT NULL,
+    sheets_done  INTEGER NOT NULL DEFAULT 0,
+    error        TEXT
+);
+CREATE TABLE IF NOT EXISTS job_sheets (
+    job_id   TEXT NOT NULL,
+    idx      INTEGER NOT NULL,
+    sheet    TEXT NOT NULL,
+    records  TEXT,
+    error    TEXT,
+    seconds  REAL,
+    PRIMARY KEY (job_id, idx)
+);
+CREATE INDEX IF NOT EXISTS jobs_created ON jobs (created_at);
+"""
+
+# Jobs in these states still have work to do
+ACTIVE = ("queued", "running")
+
+
+def connect(jobs_dir=JOBS_DIR):
+    """
+    Open the job database, creating the directory, tables and indexes on first use.
+
+    Parameters:
+    - jobs_dir: Directory holding the database and the uploaded workbooks.
+
+    Returns:
+    - sqlite3 connection returning rows as sqlite3.Row.
+    """
+    os.makedirs(jobs_dir, exist_ok=True)
+    connection = sqlite3.connect(os.path.join(jobs_dir, "jobs.sqlite"), timeout=30)
+    connection.row_factory = sqlite3.Row
+    # WAL lets the page poll while workers write progress
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.executescript(SCHEMA)
+    return connection
+
+
+def _execute(jobs_dir, sql, params=()):
+    """Run one write statement in its own transaction."""
+    connection = connect(jobs_dir)
+    try:
+        with connection:
+            connection.execute(sql, params)
+    finally:
+        connection.close()
+
+
+def _set_status(job_id, jobs_dir, status, error=None):
+    _execute(jobs_dir, "UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE id = ?",
+             (status, error, time.time(), job_id))
+
+
+def workbook_path(job_id, jobs_dir=JOBS_DIR):
+    """Where the uploaded workbook of a job is kept."""
+    return os.path.join(jobs_dir, f"{job_id}.xlsx")
+
+
+def run_job(job_id, jobs_dir=JOBS_DIR):
+    """
+    Analyse every sheet of a job, saving each sheet's results as soon as it is done.
+
+    Runs inside a worker process of the job pool. Failed sheets are recorded and
+    skipped; the job fails only if it cannot run at all.
+
+    Parameters:
+    - job_id: ID returned by submit_job.
+    - jobs_dir: Job directory.
+    """
+    # Deferred so the page process does not load the fitting stack just to queue a job
+    from lib.pipeline import fit_extracted_plate, check_plate, plate_records
+    from lib.models import DEFAULT_MODEL
+    from lib.sidecar import cached_plate
+    from lib.bootstrap import bootstrap_plate
+    from lib.layout import load_layout
+    from lib.store import store_fits, fit_settings
+
+    job = get_job(job_id, jobs_dir)
+    if job is None or job["status"] not in ACTIVE:
+        return
+    _set_status(job_id, jobs_dir, "running")
+    log_event("job_start", job=job_id, sheets=len(job["sheets"]))
+
+    try:
+        settings = job["settings"]
+        layout = load_layout(settings["layout"])
+        path = workbook_path(job_id, jobs_dir)
+        # A resumed job continues after the last saved sheet
+        done = {row["idx"] for row in job_sheets(job_id, jobs_dir)}
+
+        for idx, sheet in enumerate(job["sheets"]):
+            if idx in done:
+                continue
+            start = time.perf_counter()
+            records, error = [], None
+            with collect() as stats:
+                try:
+                    plate = cached_plate(path, sheet, settings["experiments"], layout, job["source_hash"])
+                    qc = check_plate(plate, min_z_prime=settings.get("min_z_prime"))
+                    # Jobs queued before models were selectable use the default model
+                    model = settings.get("model", DEFAULT_MODEL)
+                    criterion = settings.get("criterion", "aicc")
+                    fits = fit_extracted_plate(plate, model=model, criterion=criterion)
+                    ci = None
+                    if settings["bootstrap"]:
+                        ci = bootstrap_plate(plate.x_log, plate.responses, fits, plate.fitted_wells,
+                                             n_boot=settings["bootstrap"], seed=0, max_workers=1)
+                    records = plate_records(plate, fits, ci, qc, file=job["file"], sheet=sheet)
+                    store_fits(records, fits, job["source_hash"],
+                               fit_settings(layout["name"], plate.n_replicates, settings["bootstrap"], model, criterion))
+                except Exception as err:
+                    error = str(err)
+                    log_event("job_sheet_failed", logging.ERROR, job=job_id, sheet=sheet, error=error)
+
+            connection = connect(jobs_dir)
+            try:
+                with connection:
+                    connection.execute("INSERT OR REPLACE INTO job_sheets (job_id, idx, sheet, records, error, seconds) "
+                                       "VALUES (?, ?, ?, ?, ?, ?)",
+                                       (job_id, idx, sheet, json.dumps(records, default=float), error,
+                                        time.perf_counter() - start))
+                    connection.execute("UPDATE jobs SET sheets_done = ?, updated_at = ? WHERE id = ?",
+                                       (idx + 1, time.time(), job_id))
+            finally:
+                connection.close()
+            log_event("job_sheet_done", job=job_id, sheet=sheet, fits=len(records),
+                      stages=stats.summary(), counters=dict(stats.counters))
+
+    except Exception as err:
+        _set_status(job_id, jobs_dir, "failed", str(err))
+        log_event("job_failed", logging.ERROR, job=job_id, error=str(err))
+        return
+
+    _set_status(job_id, jobs_dir, "done")
+    log_event("job_done", job=job_id)
+
+
+_job_pool = None
+_job_pool_lock = threading.Lock()
+
+
+def get_job_pool(jobs_dir=JOBS_DIR):
+    """
+    Process pool shared by every session, created on first use.
+
+    Jobs left queued or running by a previous server process are queued again, so
+    an interrupted job resumes after its last finished sheet.
+    """
+    global _job_pool
+    with _job_pool_lock:
+        if _job_pool is None:
+            max_workers = int(os.environ.get("IC50_JOB_WORKERS", os.cpu_count()))
+            _job_pool = process_pool(max_workers)
+            for job in list_jobs(limit=-1, status=ACTIVE, jobs_dir=jobs_dir):
+                _set_status(job["id"], jobs_dir, "queued")
+                _job_pool.submit(run_job, job["id"], jobs_dir)
+                log_event("job_resumed", job=job["id"])
+        return _job_pool
+
+
+def resume_jobs(jobs_dir=JOBS_DIR):
+    """
+    Start-up hook of the app: create the job pool, which queues again the jobs a
+    previous server process left unfinished. Later calls do nothing.
+    """
+    if os.path.exists(os.path.join(jobs_dir, "jobs.sqlite")):
+        get_job_pool(jobs_dir)
+
+
+def submit_job(data, filename, sheets, settings, source_hash=None, jobs_dir=JOBS_DIR):
+    """
+    Save an uploaded workbook and queue its analysis on the job pool.
+
+    Parameters:
+    - data: Workbook bytes.
+    - filename: Original file name, kept in the results.
+    - sheets: Sheet names to analyse, in order.
+    - settings: Dictionary with layout (name), experiments (int or None), bootstrap (resamples, 0 to skip)
+      and optionally model and criterion (see pipeline.fit_extracted_plate) and min_z_prime (see qc.plate_qc).
+    - source_hash: SHA-256 of the workbook, used by the results store.
+    - jobs_dir: Job directory.
+
+    Returns:
+    - Job ID.
+    """
+    pool = get_job_pool(jobs_dir)
+    job_id = uuid.uuid4().hex[:12]
+    with open(workbook_path(job_id, jobs_dir), "wb") as handle:
+        handle.write(data)
+
+    now = time.time()
+    _execute(jobs_dir, "INSERT INTO jobs (id, created_at, updated_at, status, file, source_hash, settings, sheets) "
+                       "VALUES (?, ?, ?, 'queued', ?, ?, ?, ?)",
+             (job_id, now, now, filename, source_hash, json.dumps(settings), json.dumps(list(sheets))))
+    pool.submit(run_job, job_id, jobs_dir)
+    log_event("job_queued", job=job_id, file=filename, sheets=len(sheets))
+    return job_id
+
+
+def _job_dict(row):
+    job = dict(row)
+    job["settings"] = json.loads(job["settings"])
+    job["sheets"] = json.loads(job["sheets"])
+    return job
+
+
+def get_job(job_id, jobs_dir=JOBS_DIR):
+    """
+    Status of a job.
+
+    Returns:
+    - Dictionary with id, status, file, settings, sheets, sheets_done, error and timestamps, or None if unknown.
+    """
+    connection = connect(jobs_dir)
+    try:
+        row = connection.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    finally:
+        connection.close()
+    return None if row is None else _job_dict(row)
+
+
+def job_sheets(job_id, jobs_dir=JOBS_DIR):
+    """
+    Results saved so far for a job, in sheet order.
+
+    Returns:
+    - List of dictionaries with idx, sheet, records (list of result rows), error and seconds.
+    """
+    connection = connect(jobs_dir)
+    try:
+        rows = connection.execute("SELECT * FROM job_sheets WHERE job_id = ? ORDER BY idx", (job_id,)).fetchall()
+    finally:
+        connection.close()
+    return [{**dict(row), "records": json.loads(row["records"] or "[]")} for row in rows]
+
+
+def list_jobs(limit=20, status=None, jobs_dir=JOBS_DIR):
+    """
+    Most recent jobs first.
+
+    Parameters:
+    - limit: Maximum number of jobs; -1 for all.
+    - status: Optional tuple of states to keep.
+    - jobs_dir: Job directory.
+    """
+    where, params = "", []
+    if status:
+        where = f"WHERE status IN ({', '.join('?' * len(status))})"
+        params = list(status)
+    connection = connect(jobs_dir)
+    try:
+        rows = connection.execute(f"SELECT * FROM jobs {where} ORDER BY created_at DESC LIMIT ?",
+                                  params + [limit]).fetchall()
+    finally:
+        connection.close()
+    return [_job_dict(row) for row in rows]
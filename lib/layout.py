@@ -0,0 +1,124 @@
+# Importing Libraries
+import json
+import os
+from openpyxl.utils.cell import range_boundaries
+
+
+# Bundled layout descriptors live next to this module
+LAYOUT_DIR     = os.path.join(os.path.dirname(os.path.abspath(__file__)), "layouts")
+DEFAULT_LAYOUT = "plate_32"
+
+
+def parse_range(text):
+    """
+    Convert an Excel range such as "C25:M40" (or a single cell) to 0-based coordinates.
+
+    Parameters:
+    - text: The range in A1 notation.
+
+    Returns:
+    - Tuple of (first_row, first_col, n_rows, n_cols).
+    """
+    min_col, min_row, max_col, max_row = range_boundaries(text)
+    return min_row - 1, min_col - 1, max_row - min_row + 1, max_col - min_col + 1
+
+
+def list_layouts():
+    """Names of the bundled layout descriptors."""
+    return sorted(os.path.splitext(name)[0] for name in os.listdir(LAYOUT_DIR) if name.endswith(".json"))
+
+
+def load_layout(layout=DEFAULT_LAYOUT):
+    """
+    Load and validate a plate-layout descriptor.
+
+    A layout gives, in A1 notation, the cells of the head texts and the Y label and the
+    ranges of the compound names, the concentrations and the first replicate block.
+    Every data range has wells along its rows and concentrations along its columns;
+    ranges are concatenated well-wise in the order given. Later replicate blocks repeat
+    the first one every `spacing` rows, up to `max_blocks`.
+
+    Parameters:
+    - layout: Name of a bundled layout, path to a JSON file, or an already loaded layout.
+
+    Returns:
+    - Dictionary with the descriptor plus 0-based coordinates, n_wells and n_conc.
+    """
+    if isinstance(layout, dict) and "n_wells" in layout:
+        return layout
+
+    if isinstance(layout, dict):
+        spec = dict(layout)
+    else:
+        path = layout if layout.endswith(".json") else os.path.join(LAYOUT_DIR, layout + ".json")
+        with open(path) as handle:
+            spec = json.load(handle)
+
+    for key in ("assay", "title", "y_label", "compounds", "concentrations", "replicates"):
+        if key not in spec:
+            raise ValueError(f"Plate layout is missing '{key}'")
+
+    spec.setdefault("name", "custom")
+    for key in ("assay", "title", "y_label"):
+        spec[key + "_cell"] = parse_range(spec[key])[:2]
+
+    spec["compound_ranges"] = [parse_range(r) for r in spec["compounds"]]
+    spec["concentration_ranges"] = [parse_range(r) for r in spec["concentrations"]]
+    spec["replicate_ranges"] = [parse_range(r) for r in spec["replicates"]["first"]]
+    spec["replicates"].setdefault("max_blocks", 1)
+
+    # All data ranges must describe the same wells and concentrations
+    conc_shape = [r[2:] for r in spec["concentration_ranges"]]
+    if conc_shape != [r[2:] for r in spec["replicate_ranges"]]:
+        raise ValueError("Concentration and replicate ranges must have the same shapes")
+    if len({n_cols for _, n_cols in conc_shape}) != 1:
+        raise ValueError("Every concentration range must have the same number of columns")
+
+    spec["n_wells"] = sum(n_rows for n_rows, _ in conc_shape)
+    spec["n_conc"] = conc_shape[0][1]
+    if sum(r[2] * r[3] for r in spec["compound_ranges"]) != spec["n_wells"]:
+        raise ValueError("Compound ranges must name exactly one compound per well")
+
+    return spec
+
+
+def replicate_offsets(layout, n_blocks=None):
+    """
+    Row offsets of the replicate blocks relative to the first one.
+
+    Parameters:
+    - layout: A loaded layout.
+    - n_blocks: Number of blocks; defaults to max_blocks.
+
+    Returns:
+    - List of row offsets.
+    """
+    replicates = layout["replicates"]
+    n_blocks = replicates["max_blocks"] if n_blocks is None else n_blocks
+    return [k * replicates["spacing"] for k in range(n_blocks)]
+
+
+def experiment_start_rows(layout, n_blocks=None):
+    """Rows skipped before each replicate block, as the old start_row_dict listed them."""
+    first_row = min(r[0] for r in layout["replicate_ranges"])
+    return [first_row + offset for offset in replicate_offsets(layout, n_blocks)]
+
+
+def layout_bounds(layout):
+    """
+    Smallest (n_rows, n_cols) sheet area that contains every cell the layout can read.
+
+    Parameters:
+    - layout: A loaded layout.
+
+    Returns:
+    - Tuple of (n_rows, n_cols).
+    """
+    last_offset = replicate_offsets(layout)[-1]
+    ranges = layout["compound_ranges"] + layout["concentration_ranges"] + \
+        [(r[0] + last_offset, r[1], r[2], r[3]) for r in layout["replicate_ranges"]]
+    cells = [layout[key + "_cell"] for key in ("assay", "title", "y_label")]
+
+    n_rows = max([r[0] + r[2] for r in ranges] + [row + 1 for row, _ in cells])
+    n_cols = max([r[1] + r[3] for r in ranges] + [col + 1 for _, col in cells])
+    return n_rows, n_cols
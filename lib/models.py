@@ -0,0 +1,218 @@
+# Importing Libraries
+import numpy as np
+from lib.guess import initial_guess
+
+
+LN10 = np.log(10)
+
+# Every model is the five-parameter logistic with some of these held fixed
+PARAMETERS = ("bottom", "top", "log_ic50", "slope", "asymmetry")
+
+
+def logistic(x, bottom, top, log_ic50, slope, asymmetry=None, jacobian=False):
+    """
+    Five-parameter logistic Bottom + (Top - Bottom) / (1 + 10**((LogIC50 - x) * Slope))**Asymmetry.
+
+    The power of ten is computed once and shared by the curve and all its derivatives;
+    asymmetry None is the symmetric 4PL and skips the extra terms.
+
+    Parameters:
+    - x: Log10 concentrations, any shape broadcastable against the parameters.
+    - bottom, top, log_ic50, slope, asymmetry: Curve parameters.
+    - jacobian: Also return the partial derivatives.
+
+    Returns:
+    - y, or (y, jac) with jac of shape y.shape + (5,) in PARAMETERS order.
+    """
+    z = np.clip((log_ic50 - x) * slope, -300, 300)
+    f = 1 / (1 + np.power(10, z))
+    span = top - bottom
+    if asymmetry is None:
+        g = f
+    else:
+        # (1 + 10**z)**-s through log(1 + 10**z), which cannot overflow
+        log1p_u = np.logaddexp(0, z * LN10)
+        g = np.exp(-asymmetry * log1p_u)
+    y = bottom + span * g
+    if not jacobian:
+        return y
+
+    # dg/dz = -s * ln10 * g * u / (1 + u), with u / (1 + u) = 1 - f
+    d_z = -span * LN10 * g * (1 - f) * (1 if asymmetry is None else asymmetry)
+    d_asymmetry = 0.0 if asymmetry is None else -span * g * log1p_u
+    jac = np.stack(np.broadcast_arrays(1 - g, g, d_z * slope, d_z * (log_ic50 - x), d_asymmetry), axis=-1)
+    return y, jac
+
+
+def log_half_max(params):
+    """
+    Log10 concentration of the response halfway between Bottom and Top.
+
+    Equal to LogIC50 for symmetric curves; for the 5PL it is shifted by the asymmetry.
+
+    Parameters:
+    - params: (..., 5) full parameters.
+    """
+    log_ic50, slope, asymmetry = params[..., 2], params[..., 3], params[..., 4]
+    with np.errstate(all="ignore"):
+        shift = np.log10(np.power(2, 1 / asymmetry) - 1) / slope
+    return np.where(asymmetry == 1, log_ic50, log_ic50 - shift)
+
+
+class Model:
+    """
+    A dose-response model: the five-parameter logistic with some parameters fixed.
+
+    Fitted ("free") parameters are stored in PARAMETERS order; full() and free_params()
+    convert between them and the full five parameters.
+    """
+
+    __slots__ = ("name", "label", "free", "fixed")
+
+    def __init__(self, name, label, fixed):
+        self.name  = name
+        self.label = label
+        self.fixed = {PARAMETERS.index(key): value for key, value in fixed.items()}
+        self.free  = [i for i in range(len(PARAMETERS)) if i not in self.fixed]
+
+    def __repr__(self):
+        return f"Model({self.name!r})"
+
+    @property
+    def n_params(self):
+        return len(self.free)
+
+    @property
+    def param_names(self):
+        return [PARAMETERS[i] for i in self.free]
+
+    def full(self, params):
+        """(..., n_params) fitted parameters to (..., 5) full parameters."""
+        params = np.asarray(params, dtype=float)
+        out = np.empty(params.shape[:-1] + (len(PARAMETERS),))
+        out[..., self.free] = params
+        for i, value in self.fixed.items():
+            out[..., i] = value
+        return out
+
+    def free_params(self, full):
+        """(..., 5) full parameters to (..., n_params) fitted parameters."""
+        return np.asarray(full, dtype=float)[..., self.free]
+
+    def evaluate(self, x, params, jacobian=False):
+        """
+        Curve, and optionally its Jacobian with respect to the fitted parameters.
+
+        Parameters:
+        - x: (n_wells, n_points) log10 concentrations.
+        - params: (n_wells, n_params) fitted parameters.
+        - jacobian: Also return the (n_wells, n_points, n_params) Jacobian.
+        """
+        full = self.full(params)
+        cols = [full[:, k, None] for k in range(len(PARAMETERS))]
+        asymmetry = cols[4] if 4 in self.free else None
+        out = logistic(x, *cols[:4], asymmetry, jacobian=jacobian)
+        if not jacobian:
+            return out
+        y, jac = out
+        return y, jac[..., self.free]
+
+    def guess(self, xdata, ydata, mask=None):
+        """(n_wells, n_params) starting parameters from the 4PL initial guess."""
+        full = self.full(np.zeros((len(xdata), self.n_params)))
+        base = initial_guess(xdata, ydata, mask)
+        for i in self.free:
+            full[:, i] = base[:, i] if i < 4 else 1.0
+        return self.free_params(full)
+
+
+# Available models; "4pl" is the default everywhere
+MODELS = {model.name: model for model in [
+    Model("4pl", "4PL, variable slope", {"asymmetry": 1.0}),
+    Model("3pl", "3PL, Hill slope fixed at -1", {"slope": -1.0, "asymmetry": 1.0}),
+    Model("5pl", "5PL, asymmetric", {}),
+    Model("bottom0", "4PL, Bottom fixed at 0", {"bottom": 0.0, "asymmetry": 1.0}),
+    Model("top100", "4PL, Top fixed at 100", {"top": 100.0, "asymmetry": 1.0}),
+]}
+DEFAULT_MODEL = "4pl"
+
+# Pseudo-model choosing the best of SELECTION_MODELS for every well
+AUTO_MODEL = "auto"
+
+# Nested candidates of the automatic selection, simplest first
+SELECTION_MODELS = ("3pl", "4pl", "5pl")
+
+
+def get_model(model):
+    """Return the Model for a name, or the model itself."""
+    if isinstance(model, Model):
+        return model
+    if model not in MODELS:
+        raise ValueError(f"Unknown model '{model}'; available: {', '.join(MODELS)}")
+    return MODELS[model]
+
+
+# Smallest sum of squares used by aicc, so exact fits keep a finite score
+MIN_SSR = 1e-12
+
+
+def aicc(ssr, n_points, n_params):
+    """Corrected Akaike information criterion of least-squares fits; inf where it is undefined."""
+    n_points = np.asarray(n_points, dtype=float)
+    # A perfect fit (ssr == 0) would score -inf and be discarded; floor it instead
+    ssr = np.maximum(ssr, MIN_SSR)
+    with np.errstate(all="ignore"):
+        score = n_points * np.log(ssr / n_points) + 2 * n_params + 2 * n_params * (n_params + 1) / (n_points - n_params - 1)
+    return np.where((n_points - n_params - 1 > 0) & np.isfinite(score), score, np.inf)
+
+
+def select_models(ssr, n_points, models=SELECTION_MODELS, criterion="aicc", alpha=0.05):
+    """
+    Choose the best model of every well.
+
+    With "aicc" the lowest corrected AIC wins. With "f" the models are taken from the
+    simplest up and a model with more parameters replaces the current choice only when
+    an extra-sum-of-squares F-test rejects the simpler one at `alpha`; the candidates
+    should therefore be nested, as SELECTION_MODELS are.
+
+    Parameters:
+    - ssr: Dictionary mapping each model name to the (n_wells,) sums of squares of its fits;
+      non-converged fits should be given as inf.
+    - n_points: (n_wells,) number of points used per well.
+    - models: Candidate model names.
+    - criterion: "aicc" or "f".
+    - alpha: Significance level of the F-test.
+
+    Returns:
+    - (n_wells,) array of model names.
+    """
+    models = sorted(models, key=lambda name: get_model(name).n_params)
+    n_points = np.asarray(n_points, dtype=float)
+
+    if criterion == "aicc":
+        scores = np.array([aicc(ssr[name], n_points, get_model(name).n_params) for name in models])
+        return np.array(models)[np.argmin(scores, axis=0)]
+
+    if criterion != "f":
+        raise ValueError(f"Unknown model selection criterion '{criterion}'")
+
+    from scipy.stats import f as f_dist
+
+    best = np.full(n_points.shape, models[0], dtype=object)
+    best_ssr = np.asarray(ssr[models[0]], dtype=float).copy()
+    best_k = np.full(n_points.shape, get_model(models[0]).n_params)
+    for name in models[1:]:
+        k = get_model(name).n_params
+        candidate = np.asarray(ssr[name], dtype=float)
+        with np.errstate(all="ignore"):
+            extra = k - best_k
+            dof = n_points - k
+            f_value = ((best_ssr - candidate) / extra) / (candidate / dof)
+            p_value = np.where(extra > 0, f_dist.sf(f_value, np.maximum(extra, 1), np.maximum(dof, 1)), np.nan)
+        # Same number of parameters: the better fit wins
+        better = np.where(extra > 0, p_value < alpha, candidate < best_ssr)
+        better = (better & (dof > 0) | ~np.isfinite(best_ssr)) & np.isfinite(candidate)
+        best[better] = name
+        best_ssr[better] = candidate[better]
+        best_k[better] = k
+    return best.astype(str)
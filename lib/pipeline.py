@@ -0,0 +1,332 @@
+# Importing Libraries
+import hashlib
+from collections import defaultdict, namedtuple
+import numpy as np
+from lib.extract import (PlateReader, iter_sheet_readers, count_experiments, extract_head_data, extract_compound_names,
+                         extract_concentrations, extract_ylabel)
+from lib.layout import replicate_offsets
+from lib.plate import Plate, COMPOUND
+from lib.tools import fit_plate_chunked, fit_global, expand_fit, BatchFit
+from lib.models import get_model, select_models, log_half_max, DEFAULT_MODEL, AUTO_MODEL, SELECTION_MODELS
+from lib.qc import plate_qc, qc_summary, QCFailure
+from lib.bootstrap import bootstrap_plate
+from lib.cache import WELL_FIT_CACHE
+from lib.instrument import timer, count
+
+
+def plate_from_reader(reader, n_experiments=None):
+    """
+    Extract everything needed to analyse one plate from a parsed sheet.
+
+    Parameters:
+    - reader: PlateReader for the sheet.
+    - n_experiments: Number of experiment blocks to read; detected from the sheet if None.
+
+    Returns:
+    - Plate.
+    """
+    # The extract_* views time themselves (lib/instrument.py timed)
+    assay_text, title_text = extract_head_data(reader)
+
+    if n_experiments is None:
+        n_experiments = count_experiments(reader)
+        if n_experiments == 0:
+            raise ValueError(f"No experiment data found in sheet '{reader.sheet}'")
+
+    names = extract_compound_names(reader)
+    concentrations = extract_concentrations(reader)
+    y_label = extract_ylabel(reader)
+    with timer("extract.experiments", n_experiments=n_experiments):
+        # Every replicate block is written straight into the plate's response buffer
+        responses = np.empty((n_experiments,) + concentrations.shape)
+        for block, offset in zip(responses, replicate_offsets(reader.layout, n_experiments)):
+            reader.plate_block(reader.layout["replicate_ranges"], offset, out=block)
+
+    return Plate(responses, concentrations, names, sheet=reader.sheet, assay_text=assay_text,
+                 title_text=title_text, y_label=y_label)
+
+
+def extract_plate(uploaded_file, selected_sheet, n_experiments=None, layout=None):
+    """
+    Extract everything needed to analyse one plate from a single parse of the sheet.
+
+    Parameters:
+    - uploaded_file: The uploaded Excel file (path or file-like object).
+    - selected_sheet: The sheet name to extract data from.
+    - n_experiments: Number of experiment blocks to read; detected from the sheet if None.
+    - layout: Plate layout name, path or dictionary; the default 32-well layout if None.
+
+    Returns:
+    - Plate.
+    """
+    with timer("extract.parse", sheet=selected_sheet):
+        reader = PlateReader(uploaded_file, selected_sheet, layout)
+    return plate_from_reader(reader, n_experiments)
+
+
+def well_fit_keys(plate, mask=None):
+    """
+    Hash of the fit input of every well: its log concentrations, mean response and mask.
+
+    Parameters:
+    - plate: The Plate.
+    - mask: Optional (n_conc, n_wells) boolean array of points to fit.
+
+    Returns:
+    - List of hex digests, one per well.
+    """
+    with np.errstate(invalid="ignore"):
+        ymean = np.nanmean(plate.responses, axis=0)
+    mask = np.ones(plate.concentrations.shape, dtype=bool) if mask is None else np.asarray(mask, dtype=bool)
+
+    keys = []
+    for i in range(plate.n_wells):
+        digest = hashlib.blake2b(digest_size=16)
+        for column in (plate.x_log[:, i], ymean[:, i], mask[:, i]):
+            digest.update(np.ascontiguousarray(column).tobytes())
+        keys.append(digest.hexdigest())
+    return keys
+
+
+def _fit_changed_wells(plate, keys, mask, previous, model, max_workers=1):
+    """
+    Fit one model to every well of a plate through WELL_FIT_CACHE.
+
+    Returns:
+    - Tuple of (BatchFit in the model's own parameters, boolean array of the refitted wells).
+    """
+    model = get_model(model)
+    keys = [f"{model.name}:{key}" for key in keys]
+    wells = [WELL_FIT_CACHE.get(key) for key in keys]
+    changed = np.array([well is None for well in wells])
+    idx = np.flatnonzero(changed)
+
+    if idx.size:
+        p0 = None
+        if previous is not None and previous.params.shape == (plate.n_wells, 5):
+            p0 = model.free_params(previous.params[idx])
+        with timer("fit", sheet=plate.sheet, wells=int(idx.size), model=model.name):
+            new = fit_plate_chunked(plate.x_log[:, idx], plate.responses[:, :, idx], p0=p0,
+                                    mask=None if mask is None else np.asarray(mask, dtype=bool)[:, idx], model=model,
+                                    max_workers=max_workers)
+        for j, i in enumerate(idx):
+            wells[i] = tuple(field[j] for field in new)
+            WELL_FIT_CACHE.put(keys[i], wells[i])
+
+    return BatchFit(*(np.stack(field) for field in zip(*wells))), changed
+
+
+def fit_extracted_plate(plate, mask=None, previous=None, model=DEFAULT_MODEL, criterion="aicc", max_workers=1):
+    """
+    Fit every well of an extracted plate.
+
+    Wells whose input is unchanged since an earlier fit are taken from WELL_FIT_CACHE,
+    so excluding one outlier or reloading the sheet refits only the affected wells.
+    With model "auto" every well is fitted with each of SELECTION_MODELS and keeps the
+    one chosen by select_models.
+
+    Parameters:
+    - plate: Plate returned by extract_plate.
+    - mask: Optional (n_conc, n_wells) boolean array of points to fit.
+    - previous: Optional BatchFit of an earlier version of the plate; changed wells start from its optimum.
+    - model: Model name from lib.models.MODELS, or "auto".
+    - criterion: Model selection criterion of "auto", "aicc" or "f".
+    - max_workers: Processes fitting the chunks of large plates (see fit_plate_chunked); None for all CPUs.
+
+    Returns:
+    - BatchFit for every well of the plate in all five curve parameters (see expand_fit).
+    """
+    keys = well_fit_keys(plate, mask)
+    names = SELECTION_MODELS if model == AUTO_MODEL else (get_model(model).name,)
+
+    fitted = plate.fitted_wells
+    results = {}
+    for name in names:
+        fits, changed = _fit_changed_wells(plate, keys, mask, previous, name, max_workers)
+        results[name] = expand_fit(fits)
+        count("fit.wells", int(changed[fitted].sum()))
+        count("fit.reused", int((~changed[fitted]).sum()))
+        count("fit.function_evaluations", int(fits.nfev[fitted][changed[fitted]].sum()))
+
+    fits = results[names[0]]
+    if len(names) > 1:
+        # Points count like the fitter sees them: a replicate missing at a point does not drop the point
+        with np.errstate(invalid="ignore"):
+            valid = np.isfinite(plate.x_log) & np.isfinite(np.nanmean(plate.responses, axis=0))
+        if mask is not None:
+            valid &= np.asarray(mask, dtype=bool)
+        ssr = {name: np.where(result.converged, result.ssr, np.inf) for name, result in results.items()}
+        choice = select_models(ssr, valid.sum(axis=0), names, criterion)
+        fits = BatchFit(*(np.copy(field) for field in fits))
+        for name, result in results.items():
+            rows = choice == name
+            for field, values in zip(fits, result):
+                field[rows] = values[rows]
+
+    count("fit.failures", int((~fits.converged[fitted]).sum()))
+    return fits
+
+
+def check_plate(plate, **limits):
+    """
+    QC gate run before fitting.
+
+    Parameters:
+    - plate: The Plate.
+    - limits: plate_qc keyword arguments, e.g. min_z_prime.
+
+    Returns:
+    - PlateQC of the plate; a plate that fails raises QCFailure (a ValueError) with the reasons and metrics.
+    """
+    with timer("qc", sheet=plate.sheet):
+        qc = plate_qc(plate, **limits)
+    if not qc.passed:
+        count("qc.failed_plates")
+        raise QCFailure(qc.reasons, qc_summary(qc, plate))
+    return qc
+
+
+def plate_records(plate, fits, ci=None, qc=None, **extra):
+    """
+    One result row per fitted compound; mock and empty wells are skipped as in the app.
+
+    Parameters:
+    - plate: Plate returned by extract_plate.
+    - fits: BatchFit for the plate, as returned by fit_extracted_plate.
+    - ci: Optional BootstrapCI adding confidence interval columns.
+    - qc: Optional PlateQC adding the plate's Z'-factor and each well's replicate CV and outlier count.
+    - extra: Columns prepended to every row (e.g. file and sheet).
+
+    Returns:
+    - List of dictionaries.
+    """
+    records = []
+    for i in plate.fitted_wells:
+        name = plate.names[i]
+        bottom, top, _, slope, asymmetry = fits.params[i]
+        # Halfway between Bottom and Top, which differs from the LogIC50 parameter of the 5PL
+        log_ic50 = float(log_half_max(fits.params[i]))
+        record = {
+            **extra,
+            "assay": plate.assay_text,
+            "title": plate.title_text,
+            "well": int(i) + 1,
+            "compound": name,
+            "bottom": bottom,
+            "top": top,
+            "log_ic50": log_ic50,
+            "ic50": 10 ** log_ic50,
+            "slope": slope,
+            "asymmetry": asymmetry,
+            "model": str(fits.model[i]),
+            "converged": bool(fits.converged[i]),
+        }
+        if ci is not None:
+            record.update({
+                "ic50_ci_low": ci.ic50_low[i],
+                "ic50_ci_high": ci.ic50_high[i],
+                "slope_ci_low": ci.slope_low[i],
+                "slope_ci_high": ci.slope_high[i],
+            })
+        if qc is not None:
+            record.update({
+                "z_prime": qc.z_prime,
+                "cv": qc.well_cv[i],
+                "outliers": int(qc.outliers[:, :, i].sum()),
+            })
+        records.append(record)
+    return records
+
+
+def plate_curves(plate):
+    """
+    Mean response curve of every compound well, the input of global_records.
+
+    Returns:
+    - List of (compound, x_log, mean response) tuples.
+    """
+    return [(plate.names[i], plate.x_log[:, i], plate.mean[:, i]) for i in plate.wells(COMPOUND)]
+
+
+def global_records(curves, min_plates=2):
+    """
+    Fit every compound measured on several plates jointly (see fit_global).
+
+    Parameters:
+    - curves: Iterable of (compound, x_log, mean response) tuples, one per plate well.
+    - min_plates: Compounds seen on fewer plates are skipped.
+
+    Returns:
+    - List of dictionaries, one per compound in name order, with the shared LogIC50 and Slope and their standard errors.
+    """
+    groups = defaultdict(list)
+    for name, x_log, mean in curves:
+        groups[name].append((x_log, mean))
+
+    records = []
+    with timer("fit.global", compounds=len(groups)):
+        for name, group in sorted(groups.items(), key=lambda item: str(item[0])):
+            if len(group) < min_plates:
+                continue
+            fit = fit_global(*zip(*group))
+            log_ic50_se, slope_se = np.sqrt(np.diag(fit.pcov)[:2])
+            records.append({
+                "compound": name,
+                "plates": len(group),
+                "log_ic50": fit.log_ic50,
+                "log_ic50_se": log_ic50_se,
+                "ic50": 10 ** fit.log_ic50,
+                "slope": fit.slope,
+                "slope_se": slope_se,
+                "success": bool(fit.success),
+            })
+            count("fit.global_evaluations", int(fit.nfev))
+    return records
+
+
+# One sheet of iter_workbook_results; fits is None and error set when the sheet failed
+SheetResult = namedtuple("SheetResult", ["sheet", "records", "fits", "error", "n_replicates"])
+
+
+def iter_workbook_results(uploaded_file, n_experiments=None, layout=None, model=DEFAULT_MODEL, criterion="aicc",
+                          qc_limits=None, n_boot=0, **extra):
+    """
+    Parse, fit and tabulate every sheet of a workbook, one sheet at a time.
+
+    The workbook is opened once; each plate is released as soon as the caller moves
+    to the next sheet, so peak memory stays at about one plate.
+
+    Parameters:
+    - uploaded_file: The uploaded Excel file (path or file-like object).
+    - n_experiments: Number of experiment blocks per sheet; detected per sheet if None.
+    - layout: Plate layout name, path or dictionary.
+    - model: Model name, or "auto" (see fit_extracted_plate).
+    - criterion: Model selection criterion of "auto".
+    - qc_limits: Optional plate_qc keyword arguments (e.g. min_z_prime); plates that fail are not fitted
+      and are reported as errors. None skips the gate.
+    - n_boot: Bootstrap resamples per compound for 95% confidence intervals; 0 skips the bootstrap.
+    - extra: Columns prepended to every result row.
+
+    Returns:
+    - Generator of SheetResult (sheet, records, fits, error, n_replicates); error is None unless the sheet failed.
+    """
+    readers = iter_sheet_readers(uploaded_file, layout)
+    while True:
+        with timer("extract.parse"):
+            reader = next(readers, None)
+        if reader is None:
+            break
+
+        plate = None
+        try:
+            plate = plate_from_reader(reader, n_experiments)
+            qc = check_plate(plate, **qc_limits) if qc_limits is not None else None
+            fits = fit_extracted_plate(plate, model=model, criterion=criterion)
+            ci = None
+            if n_boot:
+                ci = bootstrap_plate(plate.x_log, plate.responses, fits, plate.fitted_wells, n_boot=n_boot, seed=0)
+            records = plate_records(plate, fits, ci, qc, **extra, sheet=reader.sheet)
+        except Exception as err:
+            yield SheetResult(reader.sheet, [], None, err, None if plate is None else plate.n_replicates)
+            continue
+        yield SheetResult(reader.sheet, records, fits, None, plate.n_replicates)
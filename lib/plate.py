@@ -0,0 +1,105 @@
+# Importing Libraries
+import numpy as np
+
+
+# Categorical well roles; a well's role comes from its compound name, case-insensitively
+ROLES = ("compound", "mock", "mek", "none")
+COMPOUND, MOCK, MEK, NONE = range(len(ROLES))
+
+
+def well_roles(names):
+    """
+    Role code of every well.
+
+    Parameters:
+    - names: Compound name of every well.
+
+    Returns:
+    - (n_wells,) int8 array of COMPOUND, MOCK, MEK or NONE.
+    """
+    lower = np.char.lower(np.asarray(names, dtype=str))
+    roles = np.full(lower.shape, COMPOUND, dtype=np.int8)
+    for role in (MOCK, MEK, NONE):
+        roles[lower == ROLES[role]] = role
+    return roles
+
+
+class Plate:
+    """
+    One plate held in contiguous float64 arrays.
+
+    Responses are (replicate, conc, well) and concentrations (conc, well), both in
+    C order; per-well data, means and log concentrations are views or computed once,
+    so the fitter, bootstrap, plots and tables all read the same buffers.
+    """
+
+    __slots__ = ("sheet", "assay_text", "title_text", "y_label", "names", "roles",
+                 "concentrations", "responses", "_x_log", "_mean", "_std")
+
+    def __init__(self, responses, concentrations, names, sheet=None, assay_text=None, title_text=None, y_label=None):
+        # No copy when the arrays already are C-ordered float64
+        self.responses      = np.ascontiguousarray(responses, dtype=np.float64)
+        self.concentrations = np.ascontiguousarray(concentrations, dtype=np.float64)
+        self.names          = np.asarray(names, dtype=object)
+        self.roles          = well_roles(self.names)
+        self.sheet          = sheet
+        self.assay_text     = assay_text
+        self.title_text     = title_text
+        self.y_label        = y_label
+        self._x_log = self._mean = self._std = None
+
+        if self.responses.ndim != 3 or self.responses.shape[1:] != self.concentrations.shape:
+            raise ValueError(f"Responses {self.responses.shape} do not match concentrations {self.concentrations.shape}")
+        if len(self.names) != self.n_wells:
+            raise ValueError(f"{len(self.names)} compound names for {self.n_wells} wells")
+
+    def __repr__(self):
+        return (f"Plate(sheet={self.sheet!r}, replicates={self.n_replicates}, "
+                f"concentrations={self.n_conc}, wells={self.n_wells})")
+
+    @property
+    def n_replicates(self):
+        return self.responses.shape[0]
+
+    @property
+    def n_conc(self):
+        return self.responses.shape[1]
+
+    @property
+    def n_wells(self):
+        return self.responses.shape[2]
+
+    @property
+    def x_log(self):
+        """(n_conc, n_wells) log10 molar concentrations; the sheet holds uM."""
+        if self._x_log is None:
+            with np.errstate(divide="ignore", invalid="ignore"):
+                self._x_log = np.log10(self.concentrations * 1e-6)
+        return self._x_log
+
+    @property
+    def mean(self):
+        """(n_conc, n_wells) mean response over replicates."""
+        if self._mean is None:
+            self._mean = self.responses.mean(axis=0)
+        return self._mean
+
+    @property
+    def std(self):
+        """(n_conc, n_wells) standard deviation over replicates."""
+        if self._std is None:
+            self._std = self.responses.std(axis=0)
+        return self._std
+
+    def wells(self, role):
+        """Indices of the wells with the given role."""
+        return np.flatnonzero(self.roles == role)
+
+    @property
+    def fitted_wells(self):
+        """Indices of the wells that get a curve: compounds and MEK controls, not mock or empty wells."""
+        return np.flatnonzero((self.roles == COMPOUND) | (self.roles == MEK))
+
+    def well(self, i):
+        """Views of one well: (x_log (n_conc,), responses (n_replicates, n_conc))."""
+        return self.x_log[:, i], self.responses[:, :, i]
@@ -0,0 +1,195 @@
+# Importing Libraries
+import numpy as np
+import matplotlib as mpl
+from matplotlib.figure import Figure
+from decimal import Decimal
+import io
+import time
+from concurrent.futures import wait, FIRST_COMPLETED
+from lib.models import logistic, log_half_max
+from lib.plate import MOCK
+from lib.instrument import record_timing
+from lib.workers import get_pool, WORKERS
+
+
+# Figure style shared by the app and the batch CLI
+PLOT_STYLE = {
+    'savefig.dpi': 600,
+    'figure.autolayout': False,
+    'figure.figsize': (12, 8),
+    'axes.labelsize': 50,
+    'axes.titlesize': 20,
+    'axes.linewidth': 2.0,
+    'font.size': 30,
+    'lines.linewidth': 2.0,
+    'lines.markersize': 8,
+    'legend.fontsize': 18,
+    'xtick.major.size': 15,
+    'ytick.major.size': 15,
+    'xtick.major.width': 2,
+    'ytick.major.width': 2,
+}
+
+# On-screen previews are rendered at a much lower resolution than the PDF export
+PREVIEW_DPI = 100
+EXPORT_DPI  = PLOT_STYLE['savefig.dpi']
+
+
+def mock_curves(plate):
+    """
+    Mean and std of the mock wells drawn behind every compound.
+    If there are more than 2 mocks only the first and the last one are used.
+
+    Parameters:
+    - plate: The Plate.
+
+    Returns:
+    - List of (label, color, mean, std) tuples.
+    """
+    mocks_idx = plate.wells(MOCK)
+    if len(mocks_idx) == 0:
+        return []
+
+    curves = []
+    for label, color, idx in [("mock A", "blue", mocks_idx[0]), ("mock P right", "black", mocks_idx[-1])]:
+        curves.append((label, color, plate.mean[:, idx], plate.std[:, idx]))
+    return curves
+
+
+def plot_compound(xdata, ydata, yerr, popt, title, y_label, mocks=(), excluded=None):
+    """
+    Build the dose-response figure of one compound with the object-oriented Figure API.
+
+    Parameters:
+    - xdata: Log10 molar concentrations.
+    - ydata: Mean response at each concentration.
+    - yerr: Std of the response at each concentration.
+    - popt: Fitted (Bottom, Top, LogIC50, Slope[, Asymmetry]).
+    - title: Plot title, usually the compound name.
+    - y_label: Y axis label.
+    - mocks: Background curves as returned by mock_curves.
+    - excluded: Optional boolean array of the points left out of the fit, drawn hollow.
+
+    Returns:
+    - A matplotlib Figure (not registered with pyplot).
+    """
+    with mpl.rc_context(PLOT_STYLE):
+        fig = Figure()
+        ax = fig.subplots()
+
+        used = np.ones(len(xdata), dtype=bool) if excluded is None else ~np.asarray(excluded, dtype=bool)
+        ax.plot(xdata[used], ydata[used], 'o', markersize=15, color="red", label="Response")
+        if not used.all():
+            ax.plot(xdata[~used], ydata[~used], 'o', markersize=15, color="red", markerfacecolor="none",
+                    markeredgewidth=2, label="Excluded")
+        ax.errorbar(xdata, ydata, yerr=yerr, linestyle='None', capsize=6, capthick=2, elinewidth=1, color="red")
+
+        # Plot the fitted curve
+        xfit = np.linspace(min(xdata), max(xdata), num=1000)
+        with np.errstate(over="ignore"):
+            yfit = logistic(xfit, *popt)
+        ax.plot(xfit, yfit, '-', color="red", lw=3)
+
+        # Plot Mocks
+        for label, color, mean, err in mocks:
+            ax.plot(xdata, mean, 'o', markersize=15, color=color, label=label, zorder=0, alpha=0.5)
+            ax.errorbar(xdata, mean, yerr=err, linestyle='None', capsize=6, capthick=2, elinewidth=1, color=color, zorder=0, alpha=0.5)
+
+        ax.set_title(title, pad=20, size=25, weight='bold')
+
+        # Add a legend and axis labels
+        ax.set_xlabel('Compound [$log_{10}(M)$]', weight='bold', size=30)
+        ax.set_ylabel(y_label, weight='bold', size=30)
+        ax.set_ylim(0, 200)
+        ax.set_xlim(-9, -3)
+        ax.tick_params(axis='x', labelsize=30)
+        ax.tick_params(axis='y', labelsize=25)
+        for tick in ax.get_xticklabels() + ax.get_yticklabels():
+            tick.set_fontweight('bold')
+
+        # Text
+        IC50 = 10 ** (log_half_max(np.asarray(popt, dtype=float)) if len(popt) == 5 else popt[2])
+        ax.text(-6, 160, "IC50="+str('%.2E' % Decimal(IC50*1e6))+r" $\mu  M$", weight='bold')
+
+        ax.legend(frameon=False, ncol=3, loc="upper left")
+
+    return fig
+
+
+def figure_bytes(fig, fmt="png", dpi=None):
+    """
+    Render a figure to image bytes the way st.pyplot does.
+
+    Parameters:
+    - fig: The matplotlib Figure.
+    - fmt: Output format ("png", "pdf", "svg", ...).
+    - dpi: Resolution; defaults to the 'savefig.dpi' of PLOT_STYLE.
+
+    Returns:
+    - Image bytes.
+    """
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format=fmt, dpi=dpi or PLOT_STYLE['savefig.dpi'], bbox_inches='tight')
+    return buffer.getvalue()
+
+
+def figure_png(fig, dpi=None):
+    """Render a figure to PNG bytes."""
+    return figure_bytes(fig, "png", dpi)
+
+
+def render_compound(job, fmt="png", dpi=PREVIEW_DPI):
+    """
+    Build and render one compound figure; the unit of work of the render pool.
+
+    Parameters:
+    - job: Tuple of plot_compound arguments (xdata, ydata, yerr, popt, title, y_label, mocks[, excluded]).
+    - fmt: Output format.
+    - dpi: Resolution.
+
+    Returns:
+    - Image bytes.
+    """
+    return figure_bytes(plot_compound(*job), fmt, dpi)
+
+
+def _render_compound_timed(job, fmt, dpi):
+    """render_compound plus the time it took inside the worker."""
+    start = time.perf_counter()
+    image = render_compound(job, fmt, dpi)
+    return image, time.perf_counter() - start
+
+
+def render_compounds(jobs, fmt="png", dpi=PREVIEW_DPI, window=None):
+    """
+    Render many compound figures on the shared worker pool (lib/workers.py).
+
+    Only `window` figures are queued or rendering at any time, and each image is released
+    once the caller has taken it, so memory does not grow with the number of compounds.
+
+    Parameters:
+    - jobs: Dictionary mapping a key to the plot_compound arguments of each figure.
+    - fmt: Output format.
+    - dpi: Resolution.
+    - window: Figures in flight at once; twice the pool size by default.
+
+    Returns:
+    - Generator of (key, image bytes) in completion order.
+    """
+    pool = get_pool()
+    window = window or 2 * WORKERS
+    pending = {}
+    queued = iter(jobs.items())
+    while True:
+        for key, job in queued:
+            pending[pool.submit(_render_compound_timed, job, fmt, dpi)] = key
+            if len(pending) >= window:
+                break
+        if not pending:
+            return
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            key = pending.pop(future)
+            image, seconds = future.result()
+            record_timing("render." + fmt, seconds, key=key, dpi=dpi)
+            yield key, image
@@ -0,0 +1,151 @@
+# Importing Libraries
+from collections import namedtuple
+import numpy as np
+from lib.plate import MOCK, MEK, COMPOUND
+
+
+# Default acceptance limits of a plate; a limit of None is not checked
+MIN_Z_PRIME = 0.5
+MIN_SIGNAL_TO_BACKGROUND = None
+
+# MEK is titrated like the compounds; only its wells' highest concentrations count as the low control
+LOW_CONTROL_POINTS = 1
+
+# Replicates further than this many replicate standard deviations from their point's median are flagged;
+# about 0.1% of normal triplicates cross it
+OUTLIER_Z = 5
+
+
+# Quality metrics of one plate
+PlateQC = namedtuple("PlateQC", ["z_prime", "signal_to_background", "high_mean", "high_std", "low_mean", "low_std",
+                                 "cv", "well_cv", "outliers", "passed", "reasons"])
+
+
+class QCFailure(ValueError):
+    """A plate rejected by the QC gate, with the reasons and its qc_summary metrics."""
+
+    def __init__(self, reasons, summary=None):
+        super().__init__(f"Plate failed QC: {'; '.join(reasons)}")
+        self.reasons = list(reasons)
+        self.summary = summary or {}
+
+    def __reduce__(self):
+        # Keep the reasons and metrics when the error crosses a process pool
+        return type(self), (self.reasons, self.summary)
+
+
+def sample_std(values, axis=None):
+    """
+    Sample standard deviation (ddof=1) ignoring NaN, the one estimator used by every QC metric.
+
+    Parameters:
+    - values: Array of responses.
+    - axis: Axis to reduce, or None for all values.
+
+    Returns:
+    - Standard deviation; NaN where fewer than two values are finite.
+    """
+    finite = np.isfinite(values)
+    n = finite.sum(axis=axis)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.where(finite, values, 0).sum(axis=axis, keepdims=True) / finite.sum(axis=axis, keepdims=True)
+        squares = np.where(finite, (values - mean) ** 2, 0).sum(axis=axis)
+        return np.sqrt(squares / np.where(n > 1, n - 1, np.nan))
+
+
+def replicate_outliers(responses, threshold=OUTLIER_Z):
+    """
+    Flag replicates that disagree with the other replicates of the same point.
+
+    Deviations from the per-point median are scaled by the median replicate standard
+    deviation of the well, so a single wild replicate stands out even with three replicates.
+
+    Parameters:
+    - responses: (n_replicates, n_conc, n_wells) responses.
+    - threshold: Robust z-score above which a replicate is flagged.
+
+    Returns:
+    - (n_replicates, n_conc, n_wells) boolean array; always False with fewer than three replicates.
+    """
+    if responses.shape[0] < 3:
+        return np.zeros(responses.shape, dtype=bool)
+    with np.errstate(invalid="ignore"):
+        deviation = np.abs(responses - np.nanmedian(responses, axis=0))
+        scale = np.nanmedian(sample_std(responses, axis=0), axis=0)
+        # Wells without any spread have nothing to flag
+        return deviation / np.where(scale > 0, scale, np.inf) > threshold
+
+
+def top_concentration_responses(plate, wells, n_points=LOW_CONTROL_POINTS):
+    """
+    Replicate responses of the given wells at their highest concentrations.
+
+    Parameters:
+    - plate: The Plate.
+    - wells: Well indices.
+    - n_points: Number of concentrations per well, counted down from the highest.
+
+    Returns:
+    - (n_replicates, n_points, len(wells)) responses.
+    """
+    concentrations = plate.concentrations[:, wells]
+    order = np.argsort(-np.where(np.isfinite(concentrations), concentrations, -np.inf), axis=0, kind="stable")[:n_points]
+    return np.take_along_axis(plate.responses[:, :, wells], order[None], axis=1)
+
+
+def plate_qc(plate, min_z_prime=MIN_Z_PRIME, min_signal_to_background=MIN_SIGNAL_TO_BACKGROUND,
+             outlier_threshold=OUTLIER_Z, low_control_points=LOW_CONTROL_POINTS):
+    """
+    Control statistics and acceptance of one plate, computed once from its replicate array.
+
+    Mock wells are the high (uninhibited) control, pooled over every concentration. MEK wells
+    are titrated, so only their replicates at the highest concentrations form the low (fully
+    inhibited) control.
+
+    Parameters:
+    - plate: The Plate.
+    - min_z_prime: Smallest acceptable Z'-factor, or None.
+    - min_signal_to_background: Smallest acceptable mock / MEK mean ratio, or None.
+    - outlier_threshold: Robust z-score of replicate_outliers.
+    - low_control_points: Highest concentrations of each MEK well used as the low control.
+
+    Returns:
+    - PlateQC with the Z'-factor, signal-to-background, control means and stds, the replicate CV
+      of every point (n_conc, n_wells) and its median per well (n_wells,), the outlier flags
+      (n_replicates, n_conc, n_wells), whether the plate passed and the reasons it did not.
+      Metrics that need a missing control are NaN and do not fail the plate.
+    """
+    high = plate.responses[:, :, plate.wells(MOCK)]
+    low = top_concentration_responses(plate, plate.wells(MEK), low_control_points)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        high_mean, high_std = (np.nanmean(high), sample_std(high)) if high.size else (np.nan, np.nan)
+        low_mean, low_std = (np.nanmean(low), sample_std(low)) if low.size else (np.nan, np.nan)
+        z_prime = 1 - 3 * (high_std + low_std) / abs(high_mean - low_mean)
+        signal_to_background = high_mean / low_mean
+
+        cv = 100 * sample_std(plate.responses, axis=0) / np.abs(np.nanmean(plate.responses, axis=0))
+        well_cv = np.nanmedian(np.where(np.isfinite(cv), cv, np.nan), axis=0)
+
+    reasons = []
+    if min_z_prime is not None and z_prime < min_z_prime:
+        reasons.append(f"Z' {z_prime:.2f} < {min_z_prime}")
+    if min_signal_to_background is not None and signal_to_background < min_signal_to_background:
+        reasons.append(f"S/B {signal_to_background:.2f} < {min_signal_to_background}")
+
+    outliers = replicate_outliers(plate.responses, outlier_threshold)
+    return PlateQC(float(z_prime), float(signal_to_background), float(high_mean), float(high_std), float(low_mean),
+                   float(low_std), cv, well_cv, outliers, not reasons, reasons)
+
+
+def qc_summary(qc, plate):
+    """Plate-level QC metrics as a flat dictionary, e.g. for logging or a table row."""
+    compounds = plate.wells(COMPOUND)
+    return {
+        "z_prime": qc.z_prime,
+        "signal_to_background": qc.signal_to_background,
+        "mock_mean": qc.high_mean,
+        "mek_mean": qc.low_mean,
+        "median_cv": float(np.nanmedian(qc.well_cv[compounds])) if compounds.size else np.nan,
+        "outliers": int(qc.outliers[:, :, compounds].sum()),
+        "passed": qc.passed,
+    }
@@ -0,0 +1,397 @@
+# Importing Libraries
+import io
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+import numpy as np
+from lib.plate import Plate
+from lib.models import MODELS, DEFAULT_MODEL, AUTO_MODEL, get_model
+from lib.instrument import log_event
+from lib.workers import process_pool
+
+
+# Requests larger than this are refused
+MAX_BODY = 64 * 1024 * 1024
+
+# Array requests arriving within this many seconds of each other are fitted as one batch
+BATCH_WINDOW = 0.02
+BATCH_MAX_WELLS = 4096
+
+# Requests waiting longer than this for a free slot are turned away with 503
+SLOT_TIMEOUT = 30
+
+
+def to_json(value):
+    """Make result rows strict JSON: numpy scalars become Python numbers and NaN or inf become null."""
+    if isinstance(value, dict):
+        return {str(key): to_json(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return [to_json(item) for item in value]
+    if isinstance(value, (bool, np.bool_)):
+        return bool(value)
+    if isinstance(value, np.integer):
+        return int(value)
+    if isinstance(value, (float, np.floating)):
+        return float(value) if np.isfinite(value) else None
+    return value
+
+
+def request_plate(body):
+    """
+    Build a Plate from the JSON body of a /fit request.
+
+    Parameters:
+    - body: Dictionary with "responses" ((n_conc, n_wells) or (n_experiments, n_conc, n_wells)),
+      either "concentrations" (uM, like the sheets) or "log_concentrations" (log10 M), each
+      (n_conc, n_wells) or (n_conc,) for all wells, and optionally "names" (one per well).
+
+    Returns:
+    - Plate.
+    """
+    responses = np.asarray(body["responses"], dtype=float)
+    if responses.ndim == 2:
+        responses = responses[None]
+    if responses.ndim != 3:
+        raise ValueError("responses must be (n_conc, n_wells) or (n_experiments, n_conc, n_wells)")
+
+    if "concentrations" in body:
+        concentrations = np.asarray(body["concentrations"], dtype=float)
+    elif "log_concentrations" in body:
+        concentrations = 10 ** (np.asarray(body["log_concentrations"], dtype=float) + 6)
+    else:
+        raise ValueError("Either concentrations (uM) or log_concentrations (log10 M) is required")
+    if concentrations.ndim == 1:
+        concentrations = np.repeat(concentrations[:, None], responses.shape[2], axis=1)
+
+    names = body.get("names") or [f"well-{i}" for i in range(1, responses.shape[2] + 1)]
+    return Plate(responses, concentrations, np.asarray(names, dtype=object))
+
+
+def fit_plates(plates, model=DEFAULT_MODEL, criterion="aicc"):
+    """
+    Fit several plates with a single batch fit, the unit of work of the array endpoint.
+
+    The wells of all plates are placed side by side, padded with NaN to a common number
+    of concentrations, so the vectorized fitter runs once for the whole batch.
+
+    Parameters:
+    - plates: List of Plates.
+    - model: Model name, or "auto".
+    - criterion: Model selection criterion of "auto".
+
+    Returns:
+    - List with the result rows of every plate.
+    """
+    from lib.pipeline import fit_extracted_plate, plate_records
+    from lib.tools import BatchFit
+
+    n_conc = max(plate.n_conc for plate in plates)
+
+    def pad(array):
+        return np.pad(array, [(0, n_conc - array.shape[0]), (0, 0)], constant_values=np.nan)
+
+    with np.errstate(invalid="ignore"):
+        means = [pad(np.nanmean(plate.responses, axis=0)) for plate in plates]
+    combined = Plate(np.concatenate(means, axis=1)[None],
+                     np.concatenate([pad(plate.concentrations) for plate in plates], axis=1),
+                     np.concatenate([plate.names for plate in plates]))
+    fits = fit_extracted_plate(combined, model=model, criterion=criterion)
+
+    results = []
+    start = 0
+    for plate in plates:
+        wells = slice(start, start + plate.n_wells)
+        results.append(plate_records(plate, BatchFit(*(field[wells] for field in fits))))
+        start += plate.n_wells
+    return results
+
+
+def fit_workbook(data, sheets=None, n_experiments=None, layout=None, model=DEFAULT_MODEL, criterion="aicc",
+                 qc_limits=None):
+    """
+    Fit an uploaded workbook, the unit of work of the workbook endpoint.
+
+    Parameters:
+    - data: Workbook bytes.
+    - sheets: Sheet names to fit; every sheet if empty.
+    - n_experiments: Number of experiment blocks per sheet; detected per sheet if None.
+    - layout: Plate layout name.
+    - model: Model name, or "auto".
+    - criterion: Model selection criterion of "auto".
+    - qc_limits: Optional plate_qc keyword arguments; failing plates are reported, not fitted.
+
+    Returns:
+    - List of {"sheet", "records", "error"} dictionaries.
+    """
+    from lib.pipeline import extract_plate, check_plate, fit_extracted_plate, plate_records, iter_workbook_results
+
+    if not sheets:
+        return [{"sheet": result.sheet, "records": result.records,
+                 "error": None if result.error is None else str(result.error)}
+                for result in iter_workbook_results(io.BytesIO(data), n_experiments, layout, model, criterion, qc_limits)]
+
+    results = []
+    for sheet in sheets:
+        try:
+            plate = extract_plate(io.BytesIO(data), sheet, n_experiments, layout)
+            qc = check_plate(plate, **qc_limits) if qc_limits is not None else None
+            fits = fit_extracted_plate(plate, model=model, criterion=criterion)
+            results.append({"sheet": sheet, "records": plate_records(plate, fits, qc=qc, sheet=sheet), "error": None})
+        except Exception as err:
+            results.append({"sheet": sheet, "records": [], "error": str(err)})
+    return results
+
+
+class ServiceStats:
+    """
+    Counters and gauges of the running service, shared by the handler and batcher threads.
+
+    Those threads run outside any collect() block, so the run counters of lib/instrument.py
+    would drop everything recorded there.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = Counter()
+        self.gauges = Counter({"active_requests": 0, "batches_in_flight": 0})
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] += n
+
+    def add(self, gauge, n):
+        """Move a gauge such as the number of requests in progress up or down."""
+        with self._lock:
+            self.gauges[gauge] += n
+
+    def snapshot(self):
+        with self._lock:
+            return {"counters": dict(self.counters), **self.gauges}
+
+
+class FitBatcher:
+    """
+    Micro-batching of array fit requests.
+
+    Requests that arrive within `window` seconds of the first one, up to `max_wells`
+    wells, are grouped by model and fitted with one fit_plates call on the worker pool.
+    """
+
+    def __init__(self, pool, window=BATCH_WINDOW, max_wells=BATCH_MAX_WELLS, stats=None):
+        self.pool = pool
+        self.window = window
+        self.max_wells = max_wells
+        self.stats = stats or ServiceStats()
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="fit-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, plate, model=DEFAULT_MODEL, criterion="aicc"):
+        """Queue one plate; returns a Future of its result rows."""
+        future = Future()
+        self._queue.put((plate, model, criterion, future))
+        return future
+
+    @property
+    def pending(self):
+        """Requests waiting to be grouped into a batch."""
+        return self._queue.qsize()
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch = [first]
+            wells = first[0].n_wells
+            deadline = time.monotonic() + self.window
+            stop = False
+            while wells < self.max_wells:
+                try:
+                    item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+                wells += item[0].n_wells
+
+            groups = {}
+            for item in batch:
+                groups.setdefault((item[1], item[2]), []).append(item)
+            for (model, criterion), items in groups.items():
+                self._dispatch(items, model, criterion)
+            if stop:
+                return
+
+    def _dispatch(self, items, model, criterion):
+        self.stats.count("batches")
+        self.stats.count("batched_requests", len(items))
+        futures = [item[3] for item in items]
+        try:
+            result = self.pool.submit(fit_plates, [item[0] for item in items], model, criterion)
+        except Exception as err:
+            for future in futures:
+                future.set_exception(err)
+            return
+        self.stats.add("batches_in_flight", 1)
+
+        def done(result):
+            self.stats.add("batches_in_flight", -1)
+            try:
+                for future, records in zip(futures, result.result()):
+                    future.set_result(records)
+            except Exception as err:
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(err)
+
+        result.add_done_callback(done)
+
+
+class FitRequestHandler(BaseHTTPRequestHandler):
+    """
+    JSON endpoints of the fitting service.
+
+    - GET /health: worker pool size, requests in progress, array requests waiting to be batched,
+      batches being fitted and the request counters.
+    - GET /models: available models.
+    - POST /fit: JSON arrays (see request_plate), plus optional "model" and "criterion"; batched.
+    - POST /workbook: raw .xlsx body; query parameters sheet (repeatable), layout, experiments,
+      model, criterion and min_z_prime.
+    """
+
+    server_version = "IC50Service/1.0"
+
+    def log_message(self, format, *args):
+        log_event("http", logging.DEBUG, client=self.client_address[0], message=format % args)
+
+    def _send(self, status, payload):
+        data = json.dumps(to_json(payload), allow_nan=False).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        if status == 503:
+            self.send_header("Retry-After", "5")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_BODY:
+            raise OverflowError(f"Request body larger than {MAX_BODY} bytes")
+        return self.rfile.read(length)
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == "/health":
+            self._send(200, {"status": "ok", "workers": self.server.workers, "max_requests": self.server.max_requests,
+                             "queued_requests": self.server.batcher.pending, **self.server.stats.snapshot()})
+        elif path == "/models":
+            self._send(200, {"default": DEFAULT_MODEL, "auto": AUTO_MODEL,
+                             "models": {name: {"label": model.label, "parameters": model.param_names}
+                                        for name, model in MODELS.items()}})
+        else:
+            self._send(404, {"error": f"Unknown path {path}"})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path not in ("/fit", "/workbook"):
+            self._send(404, {"error": f"Unknown path {url.path}"})
+            return
+
+        # Bounded concurrency: excess requests wait for a slot, then give up
+        stats = self.server.stats
+        if not self.server.slots.acquire(timeout=SLOT_TIMEOUT):
+            stats.count("rejected")
+            self._send(503, {"error": "Server busy, retry later"})
+            return
+        stats.count("requests")
+        stats.add("active_requests", 1)
+        start = time.perf_counter()
+        try:
+            if url.path == "/fit":
+                payload = self._fit()
+            else:
+                payload = self._workbook(parse_qs(url.query))
+            self._send(200, payload)
+            log_event("request", path=url.path, seconds=time.perf_counter() - start)
+        except OverflowError as err:
+            self._send(413, {"error": str(err)})
+        except (ValueError, KeyError, TypeError) as err:
+            self._send(400, {"error": str(err)})
+        except Exception as err:
+            stats.count("failed")
+            log_event("request_failed", logging.ERROR, path=url.path, error=str(err))
+            self._send(500, {"error": str(err)})
+        finally:
+            stats.add("active_requests", -1)
+            self.server.slots.release()
+
+    def _fit(self):
+        body = json.loads(self._body())
+        model = body.get("model", DEFAULT_MODEL)
+        if model != AUTO_MODEL:
+            get_model(model)
+        plate = request_plate(body)
+        records = self.server.batcher.submit(plate, model, body.get("criterion", "aicc")).result()
+        return {"records": records}
+
+    def _workbook(self, query):
+        def option(key, convert=str):
+            return convert(query[key][0]) if key in query else None
+
+        model = option("model") or DEFAULT_MODEL
+        if model != AUTO_MODEL:
+            get_model(model)
+        min_z_prime = option("min_z_prime", float)
+        future = self.server.pool.submit(fit_workbook, self._body(), query.get("sheet", []), option("experiments", int),
+                                         option("layout"), model, option("criterion") or "aicc",
+                                         None if min_z_prime is None else {"min_z_prime": min_z_prime})
+        return {"sheets": future.result()}
+
+
+def make_server(host="127.0.0.1", port=8765, workers=None, max_requests=32, window=BATCH_WINDOW):
+    """
+    Create the fitting service; call serve_forever() on the result to run it.
+
+    Parameters:
+    - host, port: Address to listen on; port 0 picks a free port (see server.server_address).
+    - workers: Worker processes doing the fitting; defaults to the number of CPUs.
+    - max_requests: Requests handled at the same time; more wait for a slot.
+    - window: Seconds array requests are collected into one batch.
+
+    Returns:
+    - ThreadingHTTPServer with the worker pool and batcher attached; server_close() shuts them down.
+    """
+    workers = workers or os.cpu_count()
+    server = ThreadingHTTPServer((host, port), FitRequestHandler)
+    server.daemon_threads = True
+    server.workers = workers
+    server.max_requests = max_requests
+    server.slots = threading.BoundedSemaphore(max_requests)
+    server.pool = process_pool(workers)
+    server.stats = ServiceStats()
+    server.batcher = FitBatcher(server.pool, window, stats=server.stats)
+
+    close = server.server_close
+
+    def server_close():
+        close()
+        server.batcher.close()
+        server.pool.shutdown(cancel_futures=True)
+
+    server.server_close = server_close
+    return server
@@ -0,0 +1,159 @@
+# Importing Libraries
+import hashlib
+import json
+import os
+import shutil
+import numpy as np
+from lib.cache import file_hash
+from lib.extract import list_sheets, iter_sheet_readers
+from lib.layout import load_layout
+from lib.pipeline import extract_plate, plate_from_reader
+from lib.plate import Plate
+from lib.instrument import timer, count
+
+
+# Parsed sheets are kept here as .npy arrays plus JSON metadata, one directory per source file
+SIDECAR_DIR = os.environ.get("IC50_SIDECARS", ".ic50_sidecars")
+
+# Bump when the extraction changes so old sidecars are ignored
+FORMAT_VERSION = 1
+
+
+def layout_key(layout):
+    """Short hash of a loaded layout, so custom layouts sharing a name never share sidecars."""
+    text = json.dumps(layout, sort_keys=True, default=str)
+    return hashlib.sha256(text.encode()).hexdigest()[:12]
+
+
+def sidecar_path(source_hash, sheet, layout, n_experiments=None, cache_dir=SIDECAR_DIR):
+    """
+    Directory of the sidecar of one parsed sheet.
+
+    Parameters:
+    - source_hash: SHA-256 of the workbook (see cache.file_hash).
+    - sheet: Sheet name.
+    - layout: Loaded plate layout.
+    - n_experiments: Number of experiment blocks read, or None when detected.
+    - cache_dir: Sidecar root directory.
+    """
+    sheet_key = hashlib.sha256(str(sheet).encode()).hexdigest()[:12]
+    blocks = "auto" if n_experiments is None else str(n_experiments)
+    return os.path.join(cache_dir, source_hash, f"v{FORMAT_VERSION}_{layout_key(layout)}_{sheet_key}_{blocks}")
+
+
+def save_plate(plate, path):
+    """
+    Write a plate as a sidecar directory: responses.npy, concentrations.npy and meta.json.
+
+    The files are written to a temporary directory that is renamed into place, so
+    readers never see a partial sidecar and concurrent writers cannot clash.
+    """
+    tmp = f"{path}.tmp{os.getpid()}"
+    os.makedirs(tmp, exist_ok=True)
+    np.save(os.path.join(tmp, "responses.npy"), plate.responses)
+    np.save(os.path.join(tmp, "concentrations.npy"), plate.concentrations)
+    meta = {"sheet": plate.sheet, "assay_text": plate.assay_text, "title_text": plate.title_text,
+            "y_label": plate.y_label, "names": plate.names.tolist()}
+    with open(os.path.join(tmp, "meta.json"), "w") as handle:
+        json.dump(meta, handle, default=str)
+
+    try:
+        os.rename(tmp, path)
+    except OSError:
+        # Another process stored the same sheet first
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def load_plate(path):
+    """
+    Load a sidecar written by save_plate, memory-mapping its arrays.
+
+    Returns:
+    - Plate whose responses and concentrations are read-only views of the files.
+    """
+    with open(os.path.join(path, "meta.json")) as handle:
+        meta = json.load(handle)
+    return Plate(np.load(os.path.join(path, "responses.npy"), mmap_mode="r"),
+                 np.load(os.path.join(path, "concentrations.npy"), mmap_mode="r"),
+                 np.array(meta["names"], dtype=object), sheet=meta["sheet"], assay_text=meta["assay_text"],
+                 title_text=meta["title_text"], y_label=meta["y_label"])
+
+
+def cached_plate(uploaded_file, selected_sheet, n_experiments=None, layout=None, source_hash=None,
+                 cache_dir=SIDECAR_DIR):
+    """
+    extract_plate backed by sidecars: the workbook is parsed on the first call only and
+    later calls memory-map the stored arrays.
+
+    Parameters:
+    - uploaded_file: The uploaded Excel file (path or file-like object).
+    - selected_sheet: The sheet name to extract data from.
+    - n_experiments: Number of experiment blocks to read; detected from the sheet if None.
+    - layout: Plate layout name, path or dictionary.
+    - source_hash: SHA-256 of the workbook; computed if omitted.
+    - cache_dir: Sidecar root directory.
+
+    Returns:
+    - Plate.
+    """
+    layout = load_layout() if layout is None else load_layout(layout)
+    path = sidecar_path(source_hash or file_hash(uploaded_file), selected_sheet, layout, n_experiments, cache_dir)
+
+    if os.path.exists(os.path.join(path, "meta.json")):
+        count("sidecar.hits")
+        with timer("sidecar.load", sheet=selected_sheet):
+            return load_plate(path)
+
+    count("sidecar.misses")
+    plate = extract_plate(uploaded_file, selected_sheet, n_experiments, layout)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with timer("sidecar.save", sheet=selected_sheet):
+        save_plate(plate, path)
+    return plate
+
+
+def convert_workbook(uploaded_file, n_experiments=None, layout=None, source_hash=None, cache_dir=SIDECAR_DIR):
+    """
+    Parse every sheet of a workbook once and store a sidecar for each.
+
+    Parameters:
+    - uploaded_file: The uploaded Excel file (path or file-like object).
+    - n_experiments: Number of experiment blocks per sheet; detected per sheet if None.
+    - layout: Plate layout name, path or dictionary.
+    - source_hash: SHA-256 of the workbook; computed if omitted.
+    - cache_dir: Sidecar root directory.
+
+    Returns:
+    - Dictionary mapping each sheet to None, or to the error that prevented its conversion.
+    """
+    layout = load_layout() if layout is None else load_layout(layout)
+    source_hash = source_hash or file_hash(uploaded_file)
+    os.makedirs(os.path.join(cache_dir, source_hash), exist_ok=True)
+
+    errors = {}
+    for reader in iter_sheet_readers(uploaded_file, layout):
+        path = sidecar_path(source_hash, reader.sheet, layout, n_experiments, cache_dir)
+        errors[reader.sheet] = None
+        if os.path.exists(os.path.join(path, "meta.json")):
+            continue
+        try:
+            save_plate(plate_from_reader(reader, n_experiments), path)
+        except Exception as err:
+            errors[reader.sheet] = err
+    return errors
+
+
+def cached_sheet_names(uploaded_file, source_hash=None, cache_dir=SIDECAR_DIR):
+    """list_sheets backed by a sheets.json next to the sidecars of the workbook."""
+    path = os.path.join(cache_dir, source_hash or file_hash(uploaded_file), "sheets.json")
+    if os.path.exists(path):
+        with open(path) as handle:
+            return json.load(handle)
+
+    sheet_names = list_sheets(uploaded_file)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.tmp{os.getpid()}"
+    with open(tmp, "w") as handle:
+        json.dump(sheet_names, handle)
+    os.replace(tmp, path)
+    return sheet_names
@@ -0,0 +1,183 @@
+# Importing Libraries
+import json
+import os
+import sqlite3
+import time
+import numpy as np
+from lib.models import AUTO_MODEL
+
+
+# Results database used by the app and, with --store, by the batch CLI
+DEFAULT_STORE = os.environ.get("IC50_STORE", "ic50_results.sqlite")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS fits (
+    id            INTEGER PRIMARY KEY,
+    created_at    REAL NOT NULL,
+    source_hash   TEXT NOT NULL,
+    file          TEXT,
+    sheet         TEXT,
+    settings      TEXT NOT NULL,
+    assay         TEXT,
+    title         TEXT,
+    well          INTEGER NOT NULL,
+    compound      TEXT NOT NULL,
+    bottom        REAL,
+    top           REAL,
+    log_ic50      REAL,
+    ic50          REAL,
+    slope         REAL,
+    asymmetry     REAL,
+    model         TEXT,
+    converged     INTEGER,
+    pcov          TEXT,
+    ic50_ci_low   REAL,
+    ic50_ci_high  REAL,
+    slope_ci_low  REAL,
+    slope_ci_high REAL,
+    z_prime       REAL,
+    cv            REAL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS fits_source ON fits (source_hash, sheet, settings, well);
+CREATE INDEX IF NOT EXISTS fits_compound ON fits (compound COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS fits_assay ON fits (assay);
+"""
+
+# Columns added after the first release, created on databases that predate them
+ADDED_COLUMNS = {"asymmetry": "REAL", "model": "TEXT", "z_prime": "REAL", "cv": "REAL"}
+
+INDEXES = """
+CREATE INDEX IF NOT EXISTS fits_model ON fits (model);
+"""
+
+COLUMNS = ["source_hash", "file", "sheet", "settings", "assay", "title", "well", "compound",
+           "bottom", "top", "log_ic50", "ic50", "slope", "asymmetry", "model", "converged", "pcov",
+           "ic50_ci_low", "ic50_ci_high", "slope_ci_low", "slope_ci_high", "z_prime", "cv"]
+
+
+def connect(db_path=DEFAULT_STORE):
+    """
+    Open the results database, creating the table and indexes on first use.
+
+    Parameters:
+    - db_path: Path of the SQLite file.
+
+    Returns:
+    - sqlite3 connection.
+    """
+    connection = sqlite3.connect(db_path, timeout=30)
+    # WAL lets the app and batch workers read while another process appends
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.executescript(SCHEMA)
+    existing = {row[1] for row in connection.execute("PRAGMA table_info(fits)")}
+    for column, kind in ADDED_COLUMNS.items():
+        if column not in existing:
+            connection.execute(f"ALTER TABLE fits ADD COLUMN {column} {kind}")
+    connection.executescript(INDEXES)
+    return connection
+
+
+def _sql_value(value):
+    """Convert NumPy scalars to plain Python values and NaN to NULL."""
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and np.isnan(value):
+        return None
+    return value
+
+
+def fit_settings(layout, experiments, bootstrap, model, criterion="aicc", **extra):
+    """
+    Settings dictionary stored with every fit; part of the key that deduplicates rows.
+
+    Parameters:
+    - layout: Plate layout name.
+    - experiments: Number of replicates of the plate.
+    - bootstrap: Number of bootstrap resamples, 0 if none.
+    - model: Model name, or "auto".
+    - criterion: Model selection criterion; only recorded for "auto", where it changes the fits.
+    - extra: Further settings (excluded wells, ...).
+
+    Returns:
+    - Dictionary for store_fits.
+    """
+    settings = {"layout": layout, "experiments": experiments, "bootstrap": bootstrap, "model": model, **extra}
+    if model == AUTO_MODEL:
+        settings["criterion"] = criterion
+    return settings
+
+
+def store_fits(records, fits, source_hash, settings, db_path=DEFAULT_STORE):
+    """
+    Append the fits of one plate to the results database.
+
+    Rows are never updated; re-storing the same file, sheet and settings is a no-op.
+
+    Parameters:
+    - records: Result rows from plate_records (must include sheet, or pass it through extra).
+    - fits: BatchFit of the plate, used for the covariance matrices.
+    - source_hash: SHA-256 of the source workbook.
+    - settings: Dictionary of the analysis settings (layout, experiments, ...).
+    - db_path: Path of the SQLite file.
+
+    Returns:
+    - Number of rows inserted.
+    """
+    settings_text = json.dumps(settings, sort_keys=True, default=str)
+    created_at = time.time()
+
+    rows = []
+    for record in records:
+        pcov = fits.pcov[record["well"] - 1]
+        row = {**record,
+               "source_hash": source_hash,
+               "settings": settings_text,
+               "converged": int(record["converged"]),
+               "pcov": json.dumps(np.where(np.isfinite(pcov), pcov, None).tolist())}
+        rows.append([created_at] + [_sql_value(row.get(column)) for column in COLUMNS])
+
+    connection = connect(db_path)
+    try:
+        with connection:
+            before = connection.total_changes
+            connection.executemany(
+                f"INSERT OR IGNORE INTO fits (created_at, {', '.join(COLUMNS)}) "
+                f"VALUES ({', '.join('?' * (len(COLUMNS) + 1))})", rows)
+            return connection.total_changes - before
+    finally:
+        connection.close()
+
+
+def _query(where, params, db_path):
+    """Run a SELECT over fits and return a DataFrame, newest first."""
+    import pandas as pd
+
+    if not os.path.exists(db_path):
+        return pd.DataFrame(columns=["created_at"] + COLUMNS)
+
+    connection = connect(db_path)
+    try:
+        table = pd.read_sql_query(f"SELECT * FROM fits WHERE {where} ORDER BY created_at DESC", connection, params=params)
+    finally:
+        connection.close()
+    table["created_at"] = pd.to_datetime(table["created_at"], unit="s")
+    return table
+
+
+def query_compound(compound, db_path=DEFAULT_STORE):
+    """
+    All stored fits of a compound (case-insensitive), newest first.
+
+    Parameters:
+    - compound: Compound name.
+    - db_path: Path of the SQLite file.
+
+    Returns:
+    - pandas DataFrame with one row per fit.
+    """
+    return _query("compound = ? COLLATE NOCASE", (compound,), db_path)
+
+
+def query_assay(assay, db_path=DEFAULT_STORE):
+    """All stored fits of an assay text, newest first."""
+    return _query("assay = ?", (assay,), db_path)
@@ -1,110 +1,291 @@
- # Importing Libraries
-import streamlit as st
+# Importing Libraries
 import numpy as np
-import pandas as pd
-from scipy.optimize import curve_fit
-from scipy.interpolate import interp1d
-from matplotlib import cm
-import matplotlib as mpl
-import matplotlib.pylab as plt
-from mpl_toolkits.axes_grid1.inset_locator import inset_axes
-from IPython.display import set_matplotlib_formats
-from decimal import Decimal
-import re
-import os
-from lib.display import *
-from lib.extract import *
-
-
-def highlight_values(series):
-    """Function to highlight specific values."""
-    colors_list = []
-    indices = []
-    color_mapping = {
-        'none': 'color: red',
-        'mock': 'color: lightblue',
-        'mek': 'color: orange'
-    }
-    
-    for idx, val in enumerate(series):
-        val_lower = val.lower()
-        if val_lower in color_mapping:
-            colors_list.append(color_mapping[val_lower])
-            indices.append(idx)
-        else:
-            colors_list.append('color: black')
-            
-    return colors_list, indices
-
-
-def reshape_dataframe(df):
-    """Reshape a long dataframe into two columns for better display."""
-    half_length = len(df) // 2
-    first_half = df.iloc[:half_length].reset_index(drop=True)
-    second_half = df.iloc[half_length:].reset_index(drop=True)
-    reshaped_data = pd.concat([first_half, second_half], axis=1)
-    reshaped_data.columns = ["Compounds 1-16", "Compounds 17-32"]
-    return reshaped_data
-
-
-
-def style_table(styler, css_color, index_column):
+from collections import namedtuple
+from functools import partial
+from lib.guess import initial_guess
+from lib.models import get_model, DEFAULT_MODEL, PARAMETERS
+from lib.plate import well_roles, COMPOUND, MOCK, MEK, NONE
+from lib.workers import get_pool
+
+
+# Define the function to be fitted
+def variable_slope_log_inhibitor_response(x, a, b, c, d):
+    y = a + ((b - a) / (1 + np.power(10, (c - x) * d)))
+    return y
+
+
+# Get initial IC50 for the fit
+def compute_x_at_ymid(x, y):
+    """LogIC50 starting point for one well; robust to non-monotonic or duplicate responses."""
+    return initial_guess(np.asarray(x, dtype=float)[None], np.asarray(y, dtype=float)[None])[0, 2]
+
+
+# Result of a batch fit, one entry per well
+BatchFit = namedtuple("BatchFit", ["params", "pcov", "converged", "n_iter", "ssr", "nfev", "model"])
+
+
+def fit_plate(x_axis, experiments_data, p0=None, mask=None, max_iter=100, xtol=1e-8, ftol=1e-10, model=DEFAULT_MODEL):
     """
-    Apply a specific color to a specific column in a DataFrame.
+    Fit a dose-response model (the variable slope 4PL by default) to every well of a
+    plate together with a vectorized Levenberg-Marquardt solver.
+
+    Each well is fitted to the mean response over experiments, as the per-compound
+    curve_fit calls did. Wells stop iterating as soon as they converge. The curve and
+    its Jacobian come from one model evaluation per step, plus one for the trial step.
 
     Parameters:
-    - styler (pd.io.formats.style.Styler): The DataFrame Styler object to update.
-    - css_color (str): The CSS color property like 'color: red'.
-    - index_column (int): The index of the column to apply the color to (starting from 0).
+    - x_axis: (n_conc, n_wells) log10 molar concentrations.
+    - experiments_data: (n_experiments, n_conc, n_wells) responses.
+    - p0: Optional (n_wells, n_params) starting parameters, e.g. a previous optimum; omitted or NaN rows
+      are estimated from the data.
+    - mask: Optional (n_conc, n_wells) boolean array of points to fit; NaNs are always excluded.
+    - max_iter: Maximum number of Levenberg-Marquardt steps per well.
+    - xtol: Relative parameter change below which a well has converged.
+    - ftol: Relative change of the sum of squares below which a well has converged.
+    - model: Model name or Model from lib.models.
 
     Returns:
-    - updated Styler object
+    - BatchFit with the model's fitted parameters params (n_wells, n_params), pcov (n_wells, n_params, n_params),
+      converged (n_wells,), n_iter (n_wells,), ssr (n_wells,), nfev (n_wells,) model evaluations and
+      model (n_wells,) names; see expand_fit for all five curve parameters.
     """
-    # Extract the color value from the CSS property
-    color = css_color.split(':')[-1].strip()
+    model = get_model(model)
+    n_params = model.n_params
+    experiments_data = np.asarray(experiments_data, dtype=float)
+    xdata = np.asarray(x_axis, dtype=float).T
+    with np.errstate(invalid="ignore"):
+        ydata = np.nanmean(experiments_data, axis=0).T
 
-    col_name = styler.data.columns[index_column]
-    return styler.applymap(lambda x: f'background-color: {color}', subset=pd.IndexSlice[:, col_name])
+    valid = np.isfinite(xdata) & np.isfinite(ydata)
+    if mask is not None:
+        valid &= np.asarray(mask, dtype=bool).T
+    xdata = np.where(valid, xdata, 0.0)
+    ydata = np.where(valid, ydata, 0.0)
 
+    n_wells = xdata.shape[0]
+    n_points = valid.sum(axis=1)
+    if p0 is None:
+        params = model.guess(xdata, ydata, valid)
+    else:
+        params = np.array(p0, dtype=float)
+        missing = ~np.all(np.isfinite(params), axis=1)
+        if missing.any():
+            params[missing] = model.guess(xdata[missing], ydata[missing], valid[missing])
 
+    def residuals(idx, p, jacobian=False):
+        with np.errstate(over="ignore", invalid="ignore"):
+            out = model.evaluate(xdata[idx], p, jacobian)
+        yfit, jac = out if jacobian else (out, None)
+        res = np.where(valid[idx], ydata[idx] - yfit, 0.0)
+        return (res, jac * valid[idx][..., None]) if jacobian else res
 
-# Define the function to be fitted
-def variable_slope_log_inhibitor_response(x, a, b, c, d):
-    y = a + ((b - a) / (1 + np.power(10, (c - x) * d)))
-    return y
+    # Wells with fewer points than parameters cannot be fitted
+    active = n_points >= n_params
+    converged = np.zeros(n_wells, dtype=bool)
+    n_iter = np.zeros(n_wells, dtype=int)
+    lam = np.full(n_wells, 1e-3)
+    ssr = np.full(n_wells, np.inf)
+    idx_all = np.arange(n_wells)
+    ssr[active] = np.sum(residuals(idx_all[active], params[active]) ** 2, axis=1)
 
+    for _ in range(max_iter):
+        idx = idx_all[active]
+        if idx.size == 0:
+            break
 
-# Get initial IC50 for the fit
-def compute_x_at_ymid(x, y):
-    # Compute Ymid
-    y_mid = np.mean([np.max(y), np.min(y)])
-    
-    # Interpolate the data
-    f = interp1d(y, x)
-    
-    # Find the X value at Ymid
-    x_mid = f(y_mid)
-    
-    return x_mid
+        p = params[idx]
+        res, jac = residuals(idx, p, jacobian=True)
+        jtj = np.einsum("wni,wnj->wij", jac, jac)
+        grad = np.einsum("wni,wn->wi", jac, res)
+
+        # Marquardt damping scales the diagonal of J^T J
+        diag = np.einsum("wii->wi", jtj)
+        damped = jtj + (lam[idx, None] * np.maximum(diag, 1e-12))[:, :, None] * np.eye(n_params)
+        with np.errstate(all="ignore"):
+            try:
+                step = np.linalg.solve(damped, grad[..., None])[..., 0]
+            except np.linalg.LinAlgError:
+                step = (np.linalg.pinv(damped) @ grad[..., None])[..., 0]
+
+            trial = p + step
+            trial_ssr = np.sum(residuals(idx, trial) ** 2, axis=1)
+
+        better = np.isfinite(trial_ssr) & (trial_ssr <= ssr[idx])
+        n_iter[idx] += 1
+
+        # Accepted steps move the parameters and relax the damping
+        small_step = np.linalg.norm(step, axis=1) <= xtol * (np.linalg.norm(p, axis=1) + xtol)
+        small_gain = (ssr[idx] - trial_ssr) <= ftol * np.maximum(ssr[idx], 1e-300)
+        done = better & (small_step | small_gain)
+
+        params[idx[better]] = trial[better]
+        ssr[idx[better]] = trial_ssr[better]
+        lam[idx] = np.where(better, lam[idx] / 10, lam[idx] * 10)
+
+        # A well whose damping blows up cannot improve any further
+        stalled = lam[idx] > 1e16
+        converged[idx[done]] = True
+        active[idx[done | stalled]] = False
+
+    # Covariance as reported by curve_fit: inv(J^T J) scaled by the residual variance
+    _, jac = residuals(idx_all, params, jacobian=True)
+    jtj = np.einsum("wni,wnj->wij", jac, jac)
+    dof = n_points - n_params
+    with np.errstate(all="ignore"):
+        pcov = np.linalg.pinv(jtj) * (ssr / dof)[:, None, None]
+    pcov[dof <= 0] = np.inf
+
+    # One evaluation for the starting point, then one trial per step
+    nfev = n_iter + (n_points >= n_params)
+
+    return BatchFit(params, pcov, converged, n_iter, ssr, nfev, np.full(n_wells, model.name, dtype=object))
+
+
+# Wells per fit_plate call on large plates: the 48 and 128 fitted wells of the 384- and 1536-well
+# layouts split into 2 and 4 chunks for the worker pool, while 32-well plates are fitted in one call
+FIT_CHUNK = 32
+
+
+def fit_plate_chunked(x_axis, experiments_data, p0=None, mask=None, model=DEFAULT_MODEL, chunk_size=FIT_CHUNK,
+                      max_workers=1):
+    """
+    fit_plate over chunks of at most `chunk_size` wells, for 384- and 1536-well plates.
+
+    Plates that fit in one chunk are fitted directly; larger ones are split and, with
+    max_workers other than 1, the chunks are fitted on the shared worker pool (lib/workers.py).
+
+    Parameters:
+    - x_axis, experiments_data, p0, mask, model: As for fit_plate.
+    - chunk_size: Wells per chunk.
+    - max_workers: 1 to stay in this process; otherwise the shared worker pool is used.
+
+    Returns:
+    - BatchFit for every well, as fit_plate returns it.
+    """
+    n_wells = np.shape(x_axis)[1]
+    if n_wells <= chunk_size:
+        return fit_plate(x_axis, experiments_data, p0=p0, mask=mask, model=model)
+
+    chunks = [slice(start, start + chunk_size) for start in range(0, n_wells, chunk_size)]
+    tasks = [(x_axis[:, chunk], experiments_data[:, :, chunk], None if p0 is None else p0[chunk],
+              None if mask is None else mask[:, chunk]) for chunk in chunks]
+    fit = partial(fit_plate, model=get_model(model).name)
+
+    if max_workers == 1:
+        parts = [fit(*task) for task in tasks]
+    else:
+        parts = list(get_pool().map(fit, *zip(*tasks)))
+    return BatchFit(*(np.concatenate(field) for field in zip(*parts)))
+
+
+def expand_fit(fits):
+    """
+    Express a BatchFit in all five curve parameters (Bottom, Top, LogIC50, Slope, Asymmetry).
+
+    Wells may come from different models; parameters a model holds fixed take their
+    fixed value and zero variance.
+
+    Returns:
+    - BatchFit with params (n_wells, 5) and pcov (n_wells, 5, 5).
+    """
+    n_wells = len(fits.params)
+    params = np.empty((n_wells, len(PARAMETERS)))
+    pcov = np.zeros((n_wells, len(PARAMETERS), len(PARAMETERS)))
+    for name in np.unique(fits.model):
+        model = get_model(str(name))
+        rows = np.flatnonzero(fits.model == name)
+        params[rows] = model.full(np.stack([fits.params[i] for i in rows]))
+        cov = np.stack([fits.pcov[i] for i in rows])
+        pcov[np.ix_(rows, model.free, model.free)] = cov
+    return fits._replace(params=params, pcov=pcov)
 
 
 def filter_compounds(arr):
     arr = np.array(arr,  dtype=str)
-    arr_lower = np.char.lower(arr)
-    
-    # Find indices of 'MEK' and 'MOCK'
-    mek_indices  = np.where(arr_lower == 'mek')[0]
-    mock_indices = np.where(arr_lower == 'mock')[0]
-    none_indices = np.where(arr_lower == 'none')[0]
+    roles = well_roles(arr)
+
+    # Indices of 'MEK', 'MOCK' and 'NONE' wells, and the names of the remaining compounds
+    return (np.flatnonzero(roles == MEK), np.flatnonzero(roles == MOCK), np.flatnonzero(roles == NONE),
+            arr[roles == COMPOUND])
+
+
+# Result of a joint fit of one compound over several plates
+GlobalFit = namedtuple("GlobalFit", ["log_ic50", "slope", "bottom", "top", "pcov", "success", "nfev", "ssr"])
+
+
+def fit_global(x_plates, y_plates, p0=None, max_nfev=None):
+    """
+    Fit one compound measured on several plates at once, with LogIC50 and Slope shared
+    by every plate and Bottom and Top fitted per plate.
+
+    Each residual depends on the two shared parameters and the two of its own plate, so
+    the Jacobian is sparse and the trust-region solver uses LSMR; hundreds of plates
+    take a single solver call. The per-plate batch fits provide the starting point.
+
+    Parameters:
+    - x_plates: Sequence of (n_conc,) log10 molar concentrations, one per plate.
+    - y_plates: Sequence of (n_conc,) mean responses, one per plate.
+    - p0: Optional starting (LogIC50, Slope); the median of the per-plate fits by default.
+    - max_nfev: Maximum number of function evaluations of the solver.
+
+    Returns:
+    - GlobalFit with the shared log_ic50 and slope, per-plate bottom and top arrays,
+      pcov of all parameters ordered (LogIC50, Slope, Bottom 1, Top 1, Bottom 2, ...),
+      success, nfev and ssr.
+    """
+    from scipy import sparse
+    from scipy.optimize import least_squares
+
+    xs = [np.asarray(x, dtype=float).ravel() for x in x_plates]
+    ys = [np.asarray(y, dtype=float).ravel() for y in y_plates]
+    n_plates = len(xs)
+
+    # Per-plate batch fits, padded with NaN to a common number of concentrations
+    width = max(len(x) for x in xs)
+    x_pad = np.full((width, n_plates), np.nan)
+    y_pad = np.full((width, n_plates), np.nan)
+    for k, (x, y) in enumerate(zip(xs, ys)):
+        x_pad[:len(x), k] = x
+        y_pad[:len(y), k] = y
+    single = fit_plate(x_pad, y_pad[None])
+    good = single.converged if single.converged.any() else np.ones(n_plates, dtype=bool)
+    shared = np.median(single.params[good, 2:], axis=0) if p0 is None else np.asarray(p0, dtype=float)
+    theta0 = np.concatenate([shared, single.params[:, :2].ravel()])
+
+    # Stack every finite point of every plate
+    valid = np.isfinite(x_pad) & np.isfinite(y_pad)
+    xdata = x_pad.T[valid.T]
+    ydata = y_pad.T[valid.T]
+    plate = np.repeat(np.arange(n_plates), valid.sum(axis=0))
+    n_points = len(xdata)
+
+    # The registry's 4PL gives curve and Jacobian; every point is its own one-point "well"
+    model = get_model("4pl")
+
+    def point_params(theta):
+        return np.column_stack([theta[2::2][plate], theta[3::2][plate],
+                                np.full(n_points, theta[0]), np.full(n_points, theta[1])])
+
+    rows = np.tile(np.arange(n_points), 4)
+    cols = np.concatenate([np.zeros(n_points, dtype=int), np.ones(n_points, dtype=int), 2 + 2 * plate, 3 + 2 * plate])
 
+    def residuals(theta):
+        return model.evaluate(xdata[:, None], point_params(theta))[:, 0] - ydata
 
-    
-    # Create mask for elements to keep
-    mask = ~np.isin(arr_lower, ['mek', 'mock', 'none'])
-    
-    # Apply mask to get filtered array
-    filtered_arr = arr[mask]
+    def jacobian(theta):
+        jac = model.evaluate(xdata[:, None], point_params(theta), jacobian=True)[1][:, 0]
+        values = np.concatenate([jac[:, 2], jac[:, 3], jac[:, 0], jac[:, 1]])
+        return sparse.csr_matrix((values, (rows, cols)), shape=(n_points, len(theta0)))
 
+    result = least_squares(residuals, theta0, jac=jacobian, method="trf", tr_solver="lsmr",
+                           x_scale="jac", max_nfev=max_nfev)
 
-    return mek_indices, mock_indices, none_indices, filtered_arr
+    # Covariance as reported by curve_fit, from the Jacobian at the optimum
+    ssr = 2 * result.cost
+    dof = n_points - len(theta0)
+    jtj = (result.jac.T @ result.jac).toarray()
+    with np.errstate(all="ignore"):
+        pcov = np.linalg.pinv(jtj) * (ssr / dof) if dof > 0 else np.full(jtj.shape, np.inf)
 
+    theta = result.x
+    return GlobalFit(theta[0], theta[1], theta[2::2], theta[3::2], pcov, result.success, result.nfev, ssr)
@@ -0,0 +1,44 @@
+# Importing Libraries
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+
+# Worker processes start from a fresh interpreter: forking the threaded app or HTTP server
+# could copy locks held by another thread into the child, which then hangs on them
+MP_CONTEXT = multiprocessing.get_context("spawn")
+
+# Size of the pool shared by rendering, bootstrapping and chunked fitting
+WORKERS = int(os.environ.get("IC50_WORKERS", os.cpu_count()))
+
+
+def process_pool(max_workers):
+    """
+    New process pool whose workers are spawned, never forked.
+
+    Parameters:
+    - max_workers: Number of worker processes.
+
+    Returns:
+    - ProcessPoolExecutor.
+    """
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=MP_CONTEXT)
+
+
+_shared_pool = None
+_shared_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """
+    Process pool shared by every caller in this process, created on first use.
+
+    Streamlit serves all sessions from one process, so this bounds the worker processes
+    of all users to WORKERS instead of one pool per request.
+    """
+    global _shared_pool
+    with _shared_pool_lock:
+        if _shared_pool is None:
+            _shared_pool = process_pool(WORKERS)
+        return _shared_pool
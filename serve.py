@@ -0,0 +1,39 @@
+# Importing Libraries
+import argparse
+import logging
+import os
+from lib.service import make_server, BATCH_WINDOW
+from lib.instrument import configure_logging, log_event
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Serve IC50 fitting over local HTTP/JSON.")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on.")
+    parser.add_argument("-p", "--port", type=int, default=8765, help="Port to listen on.")
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count(), help="Worker processes.")
+    parser.add_argument("--max-requests", type=int, default=32,
+                        help="Requests handled at the same time; more wait for a slot and get 503 after 30 s.")
+    parser.add_argument("--batch-window", type=float, default=BATCH_WINDOW, metavar="SECONDS",
+                        help="Array requests arriving this close together are fitted as one batch.")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Log every request.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    configure_logging(logging.DEBUG if args.verbose else logging.INFO)
+
+    server = make_server(args.host, args.port, args.workers, args.max_requests, args.batch_window)
+    host, port = server.server_address[:2]
+    log_event("service_start", url=f"http://{host}:{port}", workers=args.workers, max_requests=args.max_requests)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        log_event("service_stop")
+
+
+if __name__ == "__main__":
+    main()
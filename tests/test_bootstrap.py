@@ -0,0 +1,38 @@
+import numpy as np
+from lib.bootstrap import resample_responses
+from lib.models import logistic
+
+
+def masked_plate():
+    """Two single-experiment wells; one point of the first is excluded and one of the second is missing."""
+    rng = np.random.default_rng(0)
+    x_log = np.repeat(np.linspace(-9, -4, 10)[:, None], 2, axis=1)
+    params = np.array([[5.0, 100.0, -6.5, -1.0, 1.0], [0.0, 95.0, -7.0, -1.2, 1.0]])
+    responses = logistic(x_log, *params.T) + rng.normal(0, 3, x_log.shape)
+    responses[3, 0] = np.nan
+    responses[7, 1] = np.nan
+    return x_log, responses[None], params
+
+
+def test_residual_bootstrap_keeps_masked_points_out():
+    x_log, responses, params = masked_plate()
+    samples = resample_responses(x_log, responses, params, 200, np.random.default_rng(1), method="residuals")
+
+    # (n_conc, n_wells * n_boot), well-major
+    samples = samples.reshape(10, 2, 200)
+    masked = np.isnan(responses[0])
+    assert np.isnan(samples[masked]).all()
+    assert np.isfinite(samples[~masked]).all()
+
+
+def test_residual_bootstrap_draws_only_observed_residuals():
+    x_log, responses, params = masked_plate()
+    samples = resample_responses(x_log, responses, params, 50, np.random.default_rng(2), method="residuals")
+
+    yfit = logistic(x_log, *params.T)
+    drawn = samples.reshape(10, 2, 50) - yfit[:, :, None]
+    residuals = responses[0] - yfit
+    for well in range(2):
+        observed = residuals[np.isfinite(residuals[:, well]), well]
+        values = drawn[:, well][np.isfinite(drawn[:, well])]
+        assert np.isin(np.round(values, 9), np.round(observed, 9)).all()
@@ -0,0 +1,28 @@
+import numpy as np
+import lib.tools
+from benchmarks.synthetic import make_workbook
+from lib.pipeline import extract_plate
+from lib.tools import fit_plate, fit_plate_chunked
+
+
+def test_1536_plate_is_fitted_in_several_chunks(tmp_path, monkeypatch):
+    path = tmp_path / "plate_1536.xlsx"
+    make_workbook(str(path), n_experiments=2, layout="plate_1536")
+    plate = extract_plate(str(path), "Plate 1", None, "plate_1536")
+    wells = plate.fitted_wells
+    x_log, responses = plate.x_log[:, wells], plate.responses[:, :, wells]
+
+    calls = []
+
+    def counting_fit(x_axis, *args, **kwargs):
+        calls.append(x_axis.shape[1])
+        return fit_plate(x_axis, *args, **kwargs)
+
+    monkeypatch.setattr(lib.tools, "fit_plate", counting_fit)
+    chunked = fit_plate_chunked(x_log, responses, max_workers=1)
+
+    assert len(calls) > 1
+    assert sum(calls) == len(wells)
+    whole = fit_plate(x_log, responses)
+    np.testing.assert_allclose(chunked.params, whole.params, equal_nan=True)
+    np.testing.assert_array_equal(chunked.converged, whole.converged)